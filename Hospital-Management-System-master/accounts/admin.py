@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import *
+from .nurse_assignment import confirm_appointments
 
 # Register your models here.
 
@@ -8,10 +9,17 @@ admin.site.register(Nurse)
 admin.site.register(Doctor)
 admin.site.register(Patient)
 class AppointmentAdmin(admin.ModelAdmin):
-    list_display = ('appointment_id', 'doctor', 'patient', 'date', 'start_time', 'end_time', 'status')
+    list_display = ('appointment_id', 'doctor', 'patient', 'nurse', 'date', 'start_time', 'end_time', 'status')
     search_fields = ('appointment_id', 'doctor__user__last_name', 'patient__user__first_name')
+    actions = ['confirm_selected']
+
+    @admin.action(description="Confirm selected appointments and assign nurses")
+    def confirm_selected(self, request, queryset):
+        confirmed = confirm_appointments(queryset)
+        self.message_user(request, f"{confirmed} appointment(s) confirmed.")
 
 admin.site.register(Appointment, AppointmentAdmin)
 admin.site.register(DoctorAvailability)
 admin.site.register(VitalsRecord)
+admin.site.register(WaitlistEntry)
 
@@ -0,0 +1,125 @@
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .calendar_feeds import touch_feeds
+from .sequences import reserve_many
+from .slot_calendar import sync_doctors
+from .slots import DaySlots, slot_minutes, to_minute, to_time
+
+
+def series_dates(first_date, occurrences, interval_weeks=1):
+    return [first_date + datetime.timedelta(weeks=interval_weeks * n) for n in range(occurrences)]
+
+
+def _resolve(doctor, dates, start_time, now):
+    """
+    Check every occurrence against the doctor's availability and bookings.
+
+    Two queries for the whole series (availability windows, appointments on
+    those dates). The start has to fall on the slot grid of an availability
+    window, as DaySlots lays it out. Returns the (date, start, end) occurrences that can be
+    booked and a list of {date, reason} conflicts.
+    """
+    from .models import Appointment, DoctorAvailability
+
+    windows = defaultdict(list)
+    for availability_id, day, start, end in DoctorAvailability.objects.filter(doctor=doctor).values_list(
+        "id", "day", "start_time", "end_time"
+    ):
+        windows[day].append((availability_id, start, end))
+    booked = defaultdict(list)
+    for date, start, end in Appointment.holding_slots().filter(
+        doctor=doctor, date__in=dates
+    ).values_list("date", "start_time", "end_time"):
+        booked[date].append((start, end))
+
+    start_minute = to_minute(start_time)
+    if start_minute + slot_minutes() >= 24 * 60:
+        return [], [{"date": date, "reason": "A slot starting at this time would end at or past midnight"} for date in dates]
+    end_time = to_time(start_minute + slot_minutes())
+    bookable, conflicts = [], []
+    for date in dates:
+        day = DaySlots(doctor.id, date, windows.get(date.strftime("%A"), ()), booked.get(date, ()))
+        if (date, start_time) < (now.date(), now.time()):
+            conflicts.append({"date": date, "reason": "In the past"})
+        elif not any(start <= start_minute and start_minute + day.slot_length <= end
+                     for _, start, end in day.availabilities):
+            conflicts.append({"date": date, "reason": f"Doctor is not available on {date.strftime('%A')} at this time"})
+        elif not any(start <= start_minute and start_minute + day.slot_length <= end
+                     and (start_minute - start) % day.slot_length == 0
+                     for _, start, end in day.availabilities):
+            # Off the slot grid, the booking would straddle two slots
+            conflicts.append({"date": date, "reason": f"Slots start every {day.slot_length} minutes from the doctor's start time"})
+        elif not day.is_free(start_time, end_time):
+            conflicts.append({"date": date, "reason": "Slot already booked"})
+        else:
+            bookable.append((date, start_time, end_time))
+    return bookable, conflicts
+
+
+def _allocate_ids(doctor, dates):
+    """Appointment id per date, from one reservation across the days' sequences."""
+    from .models import Appointment, appointment_id, appointment_sequence
+
+    names = {appointment_sequence(doctor.id, date): date for date in dates}
+
+    def initial(missing):
+        # Days whose sequence is new continue after their existing ids
+        seeds = defaultdict(int)
+        for date, last in (
+            Appointment.objects.filter(doctor=doctor, date__in=[names[name] for name in missing])
+            .values("date").annotate(last=Max("appointment_id")).values_list("date", "last")
+        ):
+            seeds[appointment_sequence(doctor.id, date)] = int(last.rsplit("-", 1)[1])
+        return seeds
+
+    reserved = reserve_many({name: 1 for name in names}, initial)
+    return {date: appointment_id(doctor.doctor_number, date, reserved[name][0]) for name, date in names.items()}
+
+
+def book_series(patient, doctor, first_date, start_time, occurrences, interval_weeks=1, retries=None, **fields):
+    """
+    Book the same slot every `interval_weeks` weeks, `occurrences` times.
+
+    Every occurrence is resolved in one pass, ids are allocated in bulk and
+    the bookable ones are inserted with a single bulk_create in one
+    transaction. Occurrences that can't be booked are returned as conflicts
+    instead of failing the series. If a concurrent booking takes one of the
+    slots between the check and the insert, the series is re-resolved and
+    retried (up to APPOINTMENT_BOOKING_RETRIES times).
+
+    Returns (appointments, conflicts).
+    """
+    from .models import Appointment
+
+    retries = retries or getattr(settings, "APPOINTMENT_BOOKING_RETRIES", 20)
+    dates = series_dates(first_date, occurrences, interval_weeks)
+    now = timezone.localtime()
+    for _ in range(retries):
+        bookable, conflicts = _resolve(doctor, dates, start_time, now)
+        if not bookable:
+            return [], conflicts
+        ids = _allocate_ids(doctor, [date for date, _, _ in bookable])
+        appointments = [
+            Appointment(
+                appointment_id=ids[date], patient=patient, doctor=doctor,
+                date=date, start_time=start, end_time=end, **fields
+            )
+            for date, start, end in bookable
+        ]
+        try:
+            with transaction.atomic():
+                Appointment.objects.bulk_create(appointments)
+        except IntegrityError:
+            continue
+        # bulk_create sends no post_save; update the slot calendar and feeds here
+        booked_dates = [appointment.date for appointment in appointments]
+        transaction.on_commit(lambda: sync_doctors([doctor.id], booked_dates))
+        touch_feeds(doctor_ids=[doctor.id])
+        return appointments, conflicts
+    return [], [{"date": date, "reason": "Too many concurrent bookings, please try again"} for date in dates]
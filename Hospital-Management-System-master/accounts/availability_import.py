@@ -0,0 +1,176 @@
+import csv
+import datetime
+import io
+import json
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from .doctor_routing import WEEKDAYS, routing_index
+from .slot_calendar import sync_doctors, sync_suspended
+
+
+class ScheduleImportError(Exception):
+    """The schedule had invalid rows; nothing was written. `errors` lists them."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid row(s) in the schedule")
+
+
+def _parse_time(value):
+    value = str(value).strip().upper()
+    for fmt in ("%H:%M", "%H:%M:%S", "%I:%M %p", "%I %p"):
+        try:
+            return datetime.datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    raise ValueError(f"invalid time {value!r}")
+
+
+def _parse_day(value):
+    day = str(value).strip().capitalize()
+    for weekday in WEEKDAYS:
+        # Accept "Monday", "monday" and "Mon"
+        if day == weekday or (len(day) >= 3 and weekday.startswith(day)):
+            return weekday
+    raise ValueError(f"invalid day {value!r}")
+
+
+def read_schedule(data, fmt):
+    """
+    Rows of an uploaded schedule as dicts with doctor, day, start_time and end_time.
+
+    CSV needs a header with those four columns; JSON is a list of objects with
+    the same keys. `doctor` is a doctor number (DOC00012025) or a username.
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    if fmt == "csv":
+        return list(csv.DictReader(io.StringIO(data)))
+    if fmt == "json":
+        rows = json.loads(data)
+        if not isinstance(rows, list):
+            raise ScheduleImportError(["Expected a JSON list of {doctor, day, start_time, end_time} objects"])
+        return rows
+    raise ValueError(f"Unknown schedule format {fmt!r}")
+
+
+def merge_intervals(intervals):
+    """Sort-and-sweep union of (start, end) intervals; touching intervals are merged too."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def _validate(rows):
+    """(doctor key, day, start, end) per row plus the error messages, by row number."""
+    parsed, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        try:
+            doctor = str(row.get("doctor", "")).strip()
+            if not doctor:
+                raise ValueError("missing doctor")
+            day = _parse_day(row.get("day", ""))
+            start, end = _parse_time(row.get("start_time", "")), _parse_time(row.get("end_time", ""))
+            if start >= end:
+                raise ValueError("start_time must be before end_time")
+        except (ValueError, AttributeError) as e:
+            errors.append(f"Row {number}: {e}")
+            continue
+        parsed.append((doctor, day, start, end))
+    return parsed, errors
+
+
+def import_availability(rows, replace=False, dry_run=False):
+    """
+    Apply a bulk schedule: validate every row, merge overlapping intervals per
+    doctor and weekday in memory, diff against the stored rows and write the
+    difference with bulk create/update/delete in one transaction.
+
+    By default the imported intervals are merged with each doctor's existing
+    availability. With replace=True the import becomes the complete weekly
+    schedule of every doctor it mentions. Raises ScheduleImportError (and
+    writes nothing) if any row is invalid.
+
+    Returns counts: doctors, created, updated, deleted, unchanged.
+    """
+    from .models import Doctor, DoctorAvailability
+
+    parsed, errors = _validate(rows)
+    keys = {doctor for doctor, _, _, _ in parsed}
+    doctors = {}
+    for doctor_id, doctor_number, username in Doctor.objects.filter(
+        Q(doctor_number__in=keys) | Q(user__username__in=keys)
+    ).values_list("id", "doctor_number", "user__username"):
+        doctors[doctor_number] = doctors[username] = doctor_id
+    errors += [f"Unknown doctor {key!r}" for key in sorted(keys - doctors.keys())]
+    if errors:
+        raise ScheduleImportError(errors)
+
+    wanted = defaultdict(list)
+    for doctor, day, start, end in parsed:
+        wanted[doctors[doctor], day].append((start, end))
+    doctor_ids = {doctor_id for doctor_id, _ in wanted}
+
+    existing = defaultdict(list)
+    for row in DoctorAvailability.objects.filter(doctor_id__in=doctor_ids):
+        existing[row.doctor_id, row.day].append(row)
+
+    to_create, to_update, to_delete = [], [], []
+    unchanged = 0
+    for key in set(wanted) | set(existing):
+        current = existing.get(key, [])
+        intervals = wanted.get(key, [])
+        if not replace:
+            intervals = intervals + [(row.start_time, row.end_time) for row in current]
+        target = merge_intervals(intervals)
+
+        # Keep rows that already match, reuse the others for changed intervals
+        missing = set(target)
+        leftover = []
+        for row in current:
+            if (row.start_time, row.end_time) in missing:
+                missing.discard((row.start_time, row.end_time))
+                unchanged += 1
+            else:
+                leftover.append(row)
+        for start, end in sorted(missing):
+            if leftover:
+                row = leftover.pop()
+                row.start_time, row.end_time = start, end
+                to_update.append(row)
+            else:
+                to_create.append(DoctorAvailability(doctor_id=key[0], day=key[1], start_time=start, end_time=end))
+        to_delete += [row.id for row in leftover]
+
+    summary = {
+        "doctors": len(doctor_ids),
+        "created": len(to_create),
+        "updated": len(to_update),
+        "deleted": len(to_delete),
+        "unchanged": unchanged,
+    }
+    if dry_run or not (to_create or to_update or to_delete):
+        return summary
+
+    with transaction.atomic(), sync_suspended():
+        # Deletes first, so updated and new rows can't collide with rows on
+        # their way out on the (doctor, day, start, end) unique constraint
+        if to_delete:
+            DoctorAvailability.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            DoctorAvailability.objects.bulk_update(to_update, ["start_time", "end_time"], batch_size=500)
+        if to_create:
+            DoctorAvailability.objects.bulk_create(to_create, batch_size=500)
+        # Bulk writes send no per-row signals (and the deletes' are suppressed);
+        # refresh the derived data once
+        routing_index.invalidate()
+        transaction.on_commit(lambda: sync_doctors(doctor_ids))
+    return summary
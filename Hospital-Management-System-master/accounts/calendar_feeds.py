@@ -0,0 +1,137 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+ICS_STATUS = {
+    "Pending": "TENTATIVE",
+    "Confirmed": "CONFIRMED",
+    "Completed": "CONFIRMED",
+    "Canceled": "CANCELLED",
+}
+
+
+def touch_feeds(doctor_ids=(), nurse_ids=()):
+    """
+    Mark the feeds of these doctors and nurses as changed (one UPDATE), so
+    the next poll regenerates them. Called by the Appointment signals and by
+    bulk writers, which send none.
+
+    The stamp is taken when the current transaction commits, so a poll that
+    sees it also sees the change. changed_at only ever moves forward, even
+    if this process's clock is behind the one that last stamped it.
+    """
+    from .models import CalendarFeed
+
+    doctor_ids = {doctor_id for doctor_id in doctor_ids if doctor_id}
+    nurse_ids = {nurse_id for nurse_id in nurse_ids if nurse_id}
+    if not doctor_ids and not nurse_ids:
+        return
+
+    def touch():
+        CalendarFeed.objects.filter(Q(user__doctor__id__in=doctor_ids) | Q(user__nurse__id__in=nurse_ids)).update(
+            changed_at=Greatest(F("changed_at") + datetime.timedelta(microseconds=1), timezone.now())
+        )
+
+    transaction.on_commit(touch)
+
+
+def _escape(text):
+    return (
+        str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _fold(line):
+    """Split content lines longer than 75 octets (RFC 5545, 3.1)."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts, start = [], 0
+    while start < len(encoded):
+        end = min(start + (75 if not parts else 74), len(encoded))
+        # Don't cut a multi-byte character in half
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode("utf-8"))
+        start = end
+    return "\r\n ".join(parts)
+
+
+def _utc(value):
+    return value.astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _event(appointment, for_nurse):
+    patient = appointment.patient.user
+    patient_name = f"{patient.first_name} {patient.last_name}".strip() or patient.username
+    summary = f"Appointment with {patient_name}"
+    if for_nurse:
+        summary += f" (Dr. {appointment.doctor.user.last_name})"
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{appointment.appointment_id}@hospital",
+        f"DTSTAMP:{_utc(appointment.updated_at)}",
+    ]
+    if appointment.start_time:
+        start = timezone.make_aware(datetime.datetime.combine(appointment.date, appointment.start_time))
+        end = (
+            timezone.make_aware(datetime.datetime.combine(appointment.date, appointment.end_time))
+            if appointment.end_time and appointment.end_time > appointment.start_time
+            else start + datetime.timedelta(minutes=getattr(settings, "APPOINTMENT_SLOT_MINUTES", 30))
+        )
+        lines += [f"DTSTART:{_utc(start)}", f"DTEND:{_utc(end)}"]
+    else:
+        lines += [f"DTSTART;VALUE=DATE:{appointment.date:%Y%m%d}"]
+    lines += [
+        f"SUMMARY:{_escape(summary)}",
+        f"STATUS:{ICS_STATUS.get(appointment.status, 'TENTATIVE')}",
+    ]
+    if appointment.symptoms:
+        lines.append(f"DESCRIPTION:{_escape('Symptoms: ' + appointment.symptoms)}")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def render_feed(feed):
+    """The iCalendar text of a feed: the person's appointments from CALENDAR_FEED_PAST_DAYS ago on."""
+    from .models import Appointment
+
+    user = feed.user
+    appointments = Appointment.objects.filter(
+        date__gte=timezone.localdate() - datetime.timedelta(days=getattr(settings, "CALENDAR_FEED_PAST_DAYS", 30))
+    ).select_related("patient__user", "doctor__user").order_by("date", "start_time")
+    for_nurse = user.user_type == "nurse"
+    if for_nurse:
+        appointments = appointments.filter(nurse__user=user)
+    else:
+        appointments = appointments.filter(doctor__user=user)
+
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Hospital Management System//Appointments//EN",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{_escape('Appointments of ' + (user.get_full_name() or user.username))}",
+    ]
+    for appointment in appointments:
+        lines += _event(appointment, for_nurse)
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_fold(line) for line in lines) + "\r\n"
+
+
+def current_body(feed):
+    """The feed's cached text, regenerated (and stored) first if an appointment changed since."""
+    if feed.generated_at is None or feed.generated_at < feed.changed_at:
+        changed_at = feed.changed_at
+        feed.body = render_feed(feed)
+        feed.generated_at = changed_at
+        # Only store it if no change arrived while rendering
+        type(feed).objects.filter(pk=feed.pk, changed_at=changed_at).update(
+            body=feed.body, generated_at=changed_at
+        )
+    return feed.body
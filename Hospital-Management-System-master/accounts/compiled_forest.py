@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+
+# Arrays a compiled forest is saved as, one .npy file each (see save/load)
+ARRAYS = ("feature", "threshold", "left", "right", "value", "roots", "is_leaf", "classes_")
+
+
+class CompiledForest:
+    """
+    A fitted RandomForestClassifier flattened into contiguous numpy arrays.
+
+    Every tree's nodes are concatenated into shared feature / threshold /
+    children / leaf-value arrays, so evaluating a batch is a few rounds of
+    fancy indexing over all (tree, sample) pairs at once, with no per-call
+    sklearn validation or joblib dispatch.
+
+    Tree probabilities are summed in estimator order and divided by the tree
+    count exactly as sklearn does, so predict() returns the same labels as
+    the forest it was built from.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, n_features_in, is_leaf=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.is_leaf = left == np.arange(len(left)) if is_leaf is None else is_leaf
+        self.classes_ = classes
+        self.n_features_in_ = n_features_in
+
+    def save(self, directory):
+        """Write every array to directory/<name>.npy, so load() can memory-map them."""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name), allow_pickle=False)
+        np.save(os.path.join(directory, "n_features_in.npy"), np.array(self.n_features_in_))
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """
+        Read a forest written by save().
+
+        With mmap_mode="r" the arrays stay backed by the page cache, so every
+        process serving the same version shares one copy of the nodes.
+        """
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in ARRAYS
+        }
+        return cls(
+            feature=arrays["feature"],
+            threshold=arrays["threshold"],
+            left=arrays["left"],
+            right=arrays["right"],
+            value=arrays["value"],
+            roots=arrays["roots"],
+            classes=arrays["classes_"],
+            n_features_in=int(np.load(os.path.join(directory, "n_features_in.npy"))),
+            is_leaf=arrays["is_leaf"],
+        )
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Compile a fitted forest (RandomForest, ExtraTrees) or a single DecisionTreeClassifier."""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in getattr(forest, "estimators_", [forest]):
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+
+            value = np.asarray(tree.value[:, 0, :], dtype=np.float64)
+            # Older sklearn stores class counts in the leaves; normalise them
+            # the same way DecisionTreeClassifier.predict_proba does.
+            normalizer = value.sum(axis=1, keepdims=True)
+            if not np.allclose(normalizer[is_leaf], 1.0):
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+            values.append(value)
+
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.intp),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=forest.classes_,
+            n_features_in=forest.n_features_in_,
+        )
+
+    def apply(self, X):
+        """Leaf node id reached in every tree, shape (n_trees, n_samples)."""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+
+        # One (tree, sample) pair per slot; pairs drop out of `active` as soon
+        # as they reach a leaf, so shallow branches stop costing anything.
+        nodes = np.repeat(self.roots, n_samples)
+        row_offsets = np.tile(np.arange(n_samples) * n_features, len(self.roots))
+        active = np.flatnonzero(~self.is_leaf.take(nodes))
+        while active.size:
+            current = nodes.take(active)
+            go_left = flat_X.take(row_offsets.take(active) + self.feature.take(current)) <= self.threshold.take(current)
+            current = np.where(go_left, self.left.take(current), self.right.take(current))
+            nodes[active] = current
+            active = active[~self.is_leaf.take(current)]
+        return nodes.reshape(len(self.roots), n_samples)
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[1], self.value.shape[1]))
+        for tree_leaves in leaves:
+            proba += self.value.take(tree_leaves, axis=0)
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
@@ -0,0 +1,185 @@
+import datetime
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Doctor.specialization is free text, so each disease label is routed to the
+# doctors whose specialization has a word starting with one of these fragments.
+DISEASE_SPECIALIZATIONS = {
+    "(vertigo) Paroymsal  Positional Vertigo": ("ent", "otolaryng", "neurolog"),
+    "AIDS": ("infectious", "hiv"),
+    "Acne": ("dermatolog", "skin"),
+    "Alcoholic hepatitis": ("hepatolog", "gastroenterolog", "liver"),
+    "Allergy": ("allerg", "immunolog"),
+    "Arthritis": ("rheumatolog", "orthop"),
+    "Bronchial Asthma": ("pulmonolog", "respiratory", "chest"),
+    "Cervical spondylosis": ("orthop", "spine", "neurolog"),
+    "Chicken pox": ("infectious", "dermatolog", "pediatric"),
+    "Chronic cholestasis": ("hepatolog", "gastroenterolog", "liver"),
+    "Common Cold": ("ent", "general", "family"),
+    "Dengue": ("infectious",),
+    "Diabetes": ("endocrinolog", "diabet"),
+    "Dimorphic hemmorhoids(piles)": ("proctolog", "colorectal", "surgeon", "surgery"),
+    "Drug Reaction": ("allerg", "dermatolog"),
+    "Fungal infection": ("dermatolog", "skin"),
+    "GERD": ("gastroenterolog",),
+    "Gastroenteritis": ("gastroenterolog",),
+    "Heart attack": ("cardiolog", "heart"),
+    "Hepatitis B": ("hepatolog", "gastroenterolog", "liver"),
+    "Hepatitis C": ("hepatolog", "gastroenterolog", "liver"),
+    "Hepatitis D": ("hepatolog", "gastroenterolog", "liver"),
+    "Hepatitis E": ("hepatolog", "gastroenterolog", "liver"),
+    "Hypertension": ("cardiolog", "nephrolog"),
+    "Hyperthyroidism": ("endocrinolog", "thyroid"),
+    "Hypoglycemia": ("endocrinolog", "diabet"),
+    "Hypothyroidism": ("endocrinolog", "thyroid"),
+    "Impetigo": ("dermatolog", "skin", "pediatric"),
+    "Jaundice": ("hepatolog", "gastroenterolog", "liver"),
+    "Malaria": ("infectious",),
+    "Migraine": ("neurolog",),
+    "Osteoarthristis": ("orthop", "rheumatolog"),
+    "Paralysis (brain hemorrhage)": ("neurolog", "neurosurg"),
+    "Peptic ulcer diseae": ("gastroenterolog",),
+    "Pneumonia": ("pulmonolog", "respiratory", "chest"),
+    "Psoriasis": ("dermatolog", "skin"),
+    "Tuberculosis": ("pulmonolog", "respiratory", "chest", "infectious"),
+    "Typhoid": ("infectious",),
+    "Urinary tract infection": ("urolog", "nephrolog"),
+    "Varicose veins": ("vascular",),
+    "hepatitis A": ("hepatolog", "gastroenterolog", "liver"),
+}
+
+# Used for diseases without a specialist on staff (or without a mapping)
+GENERAL_SPECIALIZATIONS = ("general", "family", "internal medicine", "physician")
+
+
+def _pattern(fragments):
+    # Fragments must start a word, so "ent" matches "ENT surgeon" but not "dentist"
+    return re.compile("|".join(r"\b" + re.escape(fragment) for fragment in fragments), re.IGNORECASE)
+
+
+def next_open_days(weekdays, today, count, open_dates=(), calendar_until=None):
+    """
+    The next `count` dates from today (inclusive) falling on one of the weekday numbers.
+
+    Up to calendar_until (the end of the slot calendar) only dates in
+    open_dates, those with a free slot left, count; fully booked days are
+    skipped. Past it, every working weekday counts.
+    """
+    if not weekdays:
+        return []
+    days = []
+    date = today
+    while len(days) < count:
+        if date.weekday() in weekdays and (calendar_until is None or date > calendar_until or date in open_dates):
+            days.append(date)
+        date += datetime.timedelta(days=1)
+    return days
+
+
+class DoctorRoutingIndex:
+    """
+    Disease label -> approved doctors who treat it, with their working weekdays.
+
+    Built with two queries (approved doctors, their availabilities) and kept
+    in memory; lookups are a dict access plus one slot calendar query for the
+    next open dates.
+    The signals in accounts.signals call invalidate() whenever a doctor or an
+    availability changes, and the index is rebuilt on the next lookup. Other
+    processes only see such changes after DOCTOR_ROUTING_TTL seconds.
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._doctors = None
+        self._by_disease = None
+        self._general = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "DOCTOR_ROUTING_TTL", 300)
+
+    def invalidate(self):
+        with self._lock:
+            self._doctors = None
+
+    def _build(self):
+        from .models import Doctor, DoctorAvailability
+
+        doctors = {}
+        for doctor in Doctor.objects.filter(status="Approved", is_approved=True).select_related("user"):
+            doctors[doctor.id] = {
+                "id": doctor.id,
+                "name": f"Dr. {doctor.user.first_name} {doctor.user.last_name}".strip(),
+                "specialization": doctor.specialization,
+                "experience": doctor.experience,
+                "weekdays": set(),
+            }
+        for doctor_id, day in DoctorAvailability.objects.filter(doctor_id__in=doctors).values_list("doctor_id", "day"):
+            doctors[doctor_id]["weekdays"].add(WEEKDAYS.index(day))
+
+        # Only doctors who actually work some day are bookable; most experienced first
+        bookable = sorted(
+            (doctor for doctor in doctors.values() if doctor["weekdays"]),
+            key=lambda doctor: (-doctor["experience"], doctor["id"]),
+        )
+        by_disease = {}
+        for disease, fragments in DISEASE_SPECIALIZATIONS.items():
+            pattern = _pattern(fragments)
+            by_disease[disease] = [doctor["id"] for doctor in bookable if pattern.search(doctor["specialization"])]
+        pattern = _pattern(GENERAL_SPECIALIZATIONS)
+        general = [doctor["id"] for doctor in bookable if pattern.search(doctor["specialization"])]
+        return doctors, by_disease, general
+
+    def _get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._doctors is None or now - self._built_at > self.ttl:
+                self._doctors, self._by_disease, self._general = self._build()
+                self._built_at = now
+            return self._doctors, self._by_disease, self._general
+
+    def doctors_for(self, disease, limit=None, days=None):
+        """
+        Bookable doctors for a predicted disease label, each with its next open days.
+
+        Falls back to general practitioners when no specialist is available.
+        Open days come from the slot calendar (one query), so days that are
+        already fully booked aren't offered.
+        """
+        from .slot_calendar import horizon, open_days
+
+        limit = limit if limit is not None else getattr(settings, "DOCTOR_ROUTING_LIMIT", 5)
+        days = days if days is not None else getattr(settings, "DOCTOR_ROUTING_DAYS", 3)
+        doctors, by_disease, general = self._get()
+        doctor_ids = (by_disease.get(disease.strip()) or general)[:limit]
+
+        today = timezone.localdate()
+        calendar = open_days(doctor_ids) if doctor_ids else {}
+        _, calendar_until = horizon(today)
+        return [
+            {
+                "id": doctors[doctor_id]["id"],
+                "name": doctors[doctor_id]["name"],
+                "specialization": doctors[doctor_id]["specialization"],
+                "next_open_days": [
+                    day.isoformat() for day in next_open_days(
+                        doctors[doctor_id]["weekdays"], today, days, calendar.get(doctor_id, ()), calendar_until
+                    )
+                ],
+            }
+            for doctor_id in doctor_ids
+        ]
+
+
+routing_index = DoctorRoutingIndex()
@@ -0,0 +1,304 @@
+import threading
+import time
+
+import numpy as np
+
+
+# Display name used in prediction results for each member model
+MODEL_NAMES = {
+    "rf": "Random Forest",
+    "nb": "Naive Bayes",
+    "svm": "SVM",
+}
+
+# Evaluation order of the fast vote: cheapest model first. The first two
+# run on every row, the last only where they disagree, so the most
+# expensive model is the one skipped. The order is taken from the measured
+# cost per row (VoteStats.costs()); this one, from single-row timings of
+# the shipped models with the compiled forest, is used until enough rows
+# have been measured.
+FAST_VOTE_ORDER = ("svm", "rf", "nb")
+
+# Rows each model must have been timed on, per size class, before its
+# measured cost decides the fast-vote order
+FAST_VOTE_MIN_ROWS = 50
+
+
+def size_class(rows):
+    """Per-call overhead dominates single rows, per-row work dominates batches; costs are kept apart."""
+    return "single" if rows == 1 else "batch"
+
+
+def fast_vote_order(costs=None):
+    """Model names cheapest first by cost per row; FAST_VOTE_ORDER unless costs covers every model."""
+    if not costs or not set(FAST_VOTE_ORDER) <= set(costs):
+        return FAST_VOTE_ORDER
+    return tuple(sorted(FAST_VOTE_ORDER, key=lambda name: costs[name]))
+
+
+class VoteStats:
+    """Per-model timings and short-circuit counters of the ensemble, for the admin stats view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.rows = 0
+        self.fast_vote_rows = 0
+        self.short_circuited = 0
+        self.model_rows = {}
+        self.model_seconds = {}
+        # (size class, model name) -> rows / seconds, for costs()
+        self.class_rows = {}
+        self.class_seconds = {}
+
+    def _add(self, size, name, model_rows, seconds):
+        self.model_rows[name] = self.model_rows.get(name, 0) + model_rows
+        self.model_seconds[name] = self.model_seconds.get(name, 0.0) + seconds
+        self.class_rows[size, name] = self.class_rows.get((size, name), 0) + model_rows
+        self.class_seconds[size, name] = self.class_seconds.get((size, name), 0.0) + seconds
+
+    def record(self, rows, timings, fast_vote=False, short_circuited=0):
+        """timings maps model name -> (rows evaluated, seconds)."""
+        with self._lock:
+            self.calls += 1
+            self.rows += rows
+            if fast_vote:
+                self.fast_vote_rows += rows
+                self.short_circuited += short_circuited
+            for name, (model_rows, seconds) in timings.items():
+                self._add(size_class(rows), name, model_rows, seconds)
+
+    def merge(self, stats):
+        """Add another process's stats() (e.g. a pool worker's) into these counters."""
+        with self._lock:
+            self.calls += stats["calls"]
+            self.rows += stats["rows"]
+            self.fast_vote_rows += stats["fast_vote_rows"]
+            self.short_circuited += stats["short_circuited"]
+            for size, models in stats["size_classes"].items():
+                for name, model in models.items():
+                    self._add(size, name, model["rows"], model["total_ms"] / 1000)
+
+    def costs(self, rows, min_rows=FAST_VOTE_MIN_ROWS):
+        """
+        Measured milliseconds per row of each model in calls of the same size
+        class as a call of `rows` rows; models timed on fewer than min_rows
+        rows are left out.
+        """
+        with self._lock:
+            return self._costs_locked(size_class(rows), min_rows)
+
+    def _costs_locked(self, size, min_rows=FAST_VOTE_MIN_ROWS):
+        return {
+            name: 1000 * self.class_seconds[size, name] / model_rows
+            for (row_size, name), model_rows in self.class_rows.items()
+            if row_size == size and model_rows >= min_rows
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "rows": self.rows,
+                "fast_vote_rows": self.fast_vote_rows,
+                "short_circuited": self.short_circuited,
+                "short_circuit_rate": self.short_circuited / self.fast_vote_rows if self.fast_vote_rows else 0.0,
+                "models": {
+                    name: {
+                        "rows": rows,
+                        "total_ms": 1000 * self.model_seconds[name],
+                        "avg_ms_per_row": 1000 * self.model_seconds[name] / rows if rows else 0.0,
+                    }
+                    for name, rows in self.model_rows.items()
+                },
+                "size_classes": {
+                    size: {
+                        name: {"rows": rows, "total_ms": 1000 * self.class_seconds[size, name]}
+                        for (row_size, name), rows in self.class_rows.items()
+                        if row_size == size
+                    }
+                    for size in sorted({size for size, _ in self.class_rows})
+                },
+                "fast_vote_order": {
+                    size: list(fast_vote_order(self._costs_locked(size)))
+                    for size in ("single", "batch")
+                },
+            }
+
+
+vote_stats = VoteStats()
+
+
+class SymptomEnsemble:
+    """
+    The RandomForest, GaussianNB and SVC models fused into one artifact.
+
+    predict() encodes the symptom sets once, asks every model for class
+    probabilities over the same matrix, averages them (soft voting) in
+    numpy and decodes all labels with a single take() on the label array.
+
+    With fast_vote=True the final answer is instead the hard majority of the
+    three models, evaluated cheapest first (see fast_vote_proba()).
+    """
+
+    def __init__(self, symptom_encoder, label_encoder, models, weights=None):
+        self.symptom_encoder = symptom_encoder
+        self.label_encoder = label_encoder
+        self.labels = np.asarray(label_encoder.classes_)
+        self.models = dict(models)
+        self.weights = dict(weights or {name: 1.0 for name in self.models})
+
+    @property
+    def rf(self):
+        return self.models["rf"]
+
+    @property
+    def nb(self):
+        return self.models["nb"]
+
+    @property
+    def svm(self):
+        return self.models["svm"]
+
+    def _run_model(self, name, X, overrides, timings):
+        """
+        One model's probabilities (over its own classes) and its encoded answer per row.
+
+        The answer is the argmax of the probabilities, from the one call. For
+        the SVC that can rarely differ from predict(), whose one-vs-one vote
+        ignores the Platt scaling; a second pass over the rows isn't worth it.
+        """
+        start = time.perf_counter()
+        predictor = overrides.get(name, self.models[name])
+        model_proba = predictor.predict_proba(X)
+        labels = self.models[name].classes_.take(np.argmax(model_proba, axis=1))
+        if timings is not None:
+            timings[name] = (X.shape[0], time.perf_counter() - start)
+        return model_proba, labels
+
+    def predict_proba(self, X, overrides=None, timings=None):
+        """
+        Soft-vote probabilities over every label, plus each model's own answer
+        (encoded class per row).
+
+        `overrides` maps model names to drop-in replacements used for this call
+        (e.g. the compiled forest). If `timings` is a dict it is filled with
+        model name -> (rows, seconds).
+        """
+        overrides = overrides or {}
+        proba = np.zeros((X.shape[0], len(self.labels)))
+        per_model = {}
+        total_weight = 0.0
+        for name, model in self.models.items():
+            model_proba, per_model[name] = self._run_model(name, X, overrides, timings)
+            proba[:, model.classes_] += self.weights[name] * model_proba
+            total_weight += self.weights[name]
+        proba /= total_weight
+        return proba, per_model
+
+    def fast_vote_proba(self, X, overrides=None, timings=None, with_proba=False, order=None):
+        """
+        Hard majority vote that skips the last model where it can't matter.
+
+        The first two models of `order` (cheapest first, default
+        FAST_VOTE_ORDER) run on every row; where they agree they already are
+        the majority, so the last, most expensive one only runs on the rows
+        where they disagree, and there only predict() to break the tie. Its
+        probabilities are computed just for rows where all three disagree
+        (the soft vote of the three decides those), or for every row it ran
+        on when `with_proba` is set (top_k needs them). Returns (final,
+        proba, per_model, short_circuited): final is the encoded answer per
+        row, proba the soft vote of the models whose probabilities were
+        computed for each row, and per_model[name] is -1 for rows a model
+        skipped.
+        """
+        overrides = overrides or {}
+        first, second, last = order or FAST_VOTE_ORDER
+        proba = np.zeros((X.shape[0], len(self.labels)))
+        total_weight = np.zeros(X.shape[0])
+        per_model = {}
+        for name in (first, second):
+            model_proba, per_model[name] = self._run_model(name, X, overrides, timings)
+            proba[:, self.models[name].classes_] += self.weights[name] * model_proba
+            total_weight += self.weights[name]
+
+        final = per_model[first].copy()
+        undecided = np.flatnonzero(per_model[first] != per_model[second])
+        per_model[last] = np.full(X.shape[0], -1, dtype=final.dtype)
+        if undecided.size:
+            start = time.perf_counter()
+            predictor = overrides.get(last, self.models[last])
+            if with_proba:
+                model_proba = predictor.predict_proba(X[undecided])
+                labels = self.models[last].classes_.take(np.argmax(model_proba, axis=1))
+            else:
+                labels = predictor.predict(X[undecided])
+            # The last model sides with one of the first two, or all three differ
+            three_way = undecided[(labels != per_model[first][undecided]) & (labels != per_model[second][undecided])]
+            scored = undecided if with_proba else three_way
+            if not with_proba and three_way.size:
+                model_proba = predictor.predict_proba(X[three_way])
+            if timings is not None:
+                timings[last] = (undecided.size, time.perf_counter() - start)
+
+            per_model[last][undecided] = labels
+            if scored.size:
+                proba[scored[:, np.newaxis], self.models[last].classes_] += self.weights[last] * model_proba
+                total_weight[scored] += self.weights[last]
+            final[undecided] = labels
+            final[three_way] = np.argmax(proba[three_way], axis=1)
+        proba /= total_weight[:, np.newaxis]
+        return final, proba, per_model, X.shape[0] - undecided.size
+
+    def predict(self, symptom_sets, top_k=0, overrides=None, fast_vote=False):
+        """Predict every symptom set; returns one result dict per row."""
+        return self.predict_encoded(self.symptom_encoder.encode_batch(symptom_sets), top_k, overrides, fast_vote)
+
+    def predict_encoded(self, X, top_k=0, overrides=None, fast_vote=False, stats=None, order=None):
+        """
+        Predict already encoded rows; returns one result dict per row.
+
+        With top_k > 0 each result also lists the top_k diseases and their
+        soft-vote scores under "Top Diseases". In fast_vote mode a model that
+        was skipped for a row is reported as None, and unless `order` is
+        given the models run cheapest first by the costs measured in `stats`.
+        Timings and short-circuit counts are recorded in `stats` (a
+        VoteStats) when given.
+        """
+        timings = {} if stats is not None else None
+        if fast_vote:
+            order = order or fast_vote_order(stats.costs(X.shape[0]) if stats is not None else None)
+            final, proba, per_model, short_circuited = self.fast_vote_proba(X, overrides, timings, top_k > 0, order)
+        else:
+            proba, per_model = self.predict_proba(X, overrides, timings)
+            final, short_circuited = np.argmax(proba, axis=1), 0
+        if stats is not None:
+            stats.record(X.shape[0], timings, fast_vote, short_circuited)
+
+        columns = {"Final Prediction": self.labels.take(final)}
+        for name, model_classes in per_model.items():
+            columns[MODEL_NAMES[name]] = np.where(model_classes >= 0, self.labels.take(model_classes), None)
+
+        results = [
+            {key: None if values[row] is None else str(values[row]) for key, values in columns.items()}
+            for row in range(X.shape[0])
+        ]
+
+        if top_k > 0:
+            top_k = min(top_k, len(self.labels))
+            best = np.argpartition(-proba, top_k - 1, axis=1)[:, :top_k]
+            best_scores = np.take_along_axis(proba, best, axis=1)
+            order = np.argsort(-best_scores, axis=1, kind="stable")
+            best = np.take_along_axis(best, order, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            best_labels = self.labels.take(best)
+            for row, result in enumerate(results):
+                result["Top Diseases"] = [
+                    {"disease": str(label), "score": round(float(score), 4)}
+                    for label, score in zip(best_labels[row], best_scores[row])
+                ]
+
+        return results
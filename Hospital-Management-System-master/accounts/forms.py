@@ -28,22 +28,7 @@ class DoctorAvailabilityForm(forms.ModelForm):
         if start_time and end_time and start_time >= end_time:
             raise ValidationError("Start time must be before end time.")
 
-        # Check for overlapping availability slots
-        overlapping_availabilities = DoctorAvailability.objects.filter(
-            doctor=self.doctor,  # Use self.doctor instead of self.instance.doctor
-            day=day,
-            start_time__lt=end_time,
-            end_time__gt=start_time
-        ).exclude(id=self.instance.id if self.instance else None)
-
-        if overlapping_availabilities.exists():
-            # Merge overlapping slots
-            first_overlap = overlapping_availabilities.first()
-            first_overlap.start_time = min(first_overlap.start_time, start_time)
-            first_overlap.end_time = max(first_overlap.end_time, end_time)
-            first_overlap.save()
-            raise ValidationError("Overlapping availability detected. Merged with an existing slot.")
-
+        # Overlapping slots are merged by accounts.availability_import when saving
         return cleaned_data
     
 class DoctorSelectionForm(forms.Form):
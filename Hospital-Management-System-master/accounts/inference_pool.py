@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+
+
+class PoolSaturated(Exception):
+    """Raised when the prediction queue is full; callers should answer 503."""
+
+
+class PredictionTimeout(Exception):
+    """Raised when a prediction did not finish within PREDICTION_TIMEOUT."""
+
+
+def _init_worker(settings_module):
+    # Needed when the platform spawns instead of forking workers
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    django.setup()
+
+
+def _timed_predict(symptom_sets, top_k):
+    """
+    Runs inside a pool worker; returns the results plus timing info and a
+    snapshot of the worker's prediction cache and vote stats.
+    """
+    from .ensemble import vote_stats
+    from .predict import predict_batch
+    from .prediction_cache import prediction_cache
+
+    started = time.time()
+    results = predict_batch(symptom_sets, top_k)
+    run_time = time.time() - started
+    worker_stats = {"cache": prediction_cache.stats(), "vote": vote_stats.stats()}
+    return results, started, run_time, (os.getpid(), worker_stats)
+
+
+class InferencePool:
+    """
+    Runs predictions in a pool of worker processes so CPU-bound model calls
+    don't hold up the WSGI thread serving other requests.
+
+    At most PREDICTION_POOL_QUEUE_SIZE predictions may be queued or running
+    at once; beyond that predict() fails fast with PoolSaturated. The
+    executor is created on first use, i.e. after the app server forked.
+
+    Each worker has its own prediction cache and vote stats; every result
+    carries the worker's latest counters, kept per worker pid for
+    worker_stats().
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.queue_wait_total = 0.0
+        self.run_time_total = 0.0
+        self.run_time_max = 0.0
+        self._worker_stats = {}
+
+    @property
+    def workers(self):
+        return getattr(settings, "PREDICTION_POOL_WORKERS", 2)
+
+    @property
+    def queue_size(self):
+        return getattr(settings, "PREDICTION_POOL_QUEUE_SIZE", 16)
+
+    @property
+    def timeout(self):
+        return getattr(settings, "PREDICTION_TIMEOUT", 5)
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._slots = threading.BoundedSemaphore(self.queue_size)
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        initializer=_init_worker,
+                        initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "hospital_management_system.settings"),),
+                    )
+        return self._executor
+
+    def _release(self, future):
+        self._slots.release()
+        with self._stats_lock:
+            if future.cancelled():
+                self.cancelled += 1
+                return
+            if future.exception() is not None:
+                self.failed += 1
+                return
+            _, started, run_time, (pid, worker_stats) = future.result()
+            self._worker_stats[pid] = worker_stats
+            self.completed += 1
+            self.queue_wait_total += max(started - future.submitted_at, 0.0)
+            self.run_time_total += run_time
+            self.run_time_max = max(self.run_time_max, run_time)
+
+    def predict(self, symptom_sets, top_k=0):
+        """Predict in a worker process, honouring the queue bound and timeout."""
+        executor = self._get_executor()
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.rejected += 1
+            raise PoolSaturated("Prediction queue is full")
+
+        with self._stats_lock:
+            self.submitted += 1
+        submitted_at = time.time()
+        try:
+            future = executor.submit(_timed_predict, symptom_sets, top_k)
+        except Exception:
+            self._slots.release()
+            raise
+        future.submitted_at = submitted_at
+        future.add_done_callback(self._release)
+
+        try:
+            results = future.result(timeout=self.timeout)[0]
+        except FutureTimeoutError:
+            # The slot stays taken until the worker actually finishes
+            future.cancel()
+            with self._stats_lock:
+                self.timed_out += 1
+            raise PredictionTimeout(f"Prediction took longer than {self.timeout}s")
+        return results
+
+    def stats(self):
+        with self._stats_lock:
+            completed = self.completed
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "timeout": self.timeout,
+                "in_flight": self.submitted - completed - self.failed - self.cancelled,
+                "submitted": self.submitted,
+                "completed": completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "failed": self.failed,
+                "avg_queue_wait_ms": 1000 * self.queue_wait_total / completed if completed else 0.0,
+                "avg_run_time_ms": 1000 * self.run_time_total / completed if completed else 0.0,
+                "max_run_time_ms": 1000 * self.run_time_max,
+            }
+
+    def worker_stats(self, name):
+        """The latest `name` ("cache" or "vote") stats reported by each worker process."""
+        with self._stats_lock:
+            return [stats[name] for stats in self._worker_stats.values()]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            with self._stats_lock:
+                self._reset_stats()
+
+
+inference_pool = InferencePool()
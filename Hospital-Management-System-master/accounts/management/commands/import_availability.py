@@ -0,0 +1,33 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.availability_import import ScheduleImportError, import_availability, read_schedule
+
+
+class Command(BaseCommand):
+    help = "Bulk import doctor availability from a CSV or JSON schedule (doctor, day, start_time, end_time)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "json"], help="default: from the file extension")
+        parser.add_argument("--replace", action="store_true",
+                            help="make the file the complete weekly schedule of every doctor it lists")
+        parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or ("json" if os.path.splitext(options["path"])[1].lower() == ".json" else "csv")
+        try:
+            with open(options["path"], "rb") as f:
+                rows = read_schedule(f.read(), fmt)
+            summary = import_availability(rows, replace=options["replace"], dry_run=options["dry_run"])
+        except ScheduleImportError as e:
+            raise CommandError("\n".join([str(e)] + e.errors)) from e
+        except (OSError, ValueError, UnicodeDecodeError, csv.Error) as e:
+            raise CommandError(f"Could not read the file: {e}") from e
+        prefix = "Dry run: " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{summary['doctors']} doctor(s): {summary['created']} created, {summary['updated']} updated, "
+            f"{summary['deleted']} deleted, {summary['unchanged']} unchanged"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from accounts.slot_calendar import extend_horizon, horizon, sync_doctors
+
+
+class Command(BaseCommand):
+    help = "Roll the SlotCalendar horizon forward (run daily), or rebuild it with --full."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="re-derive every slot in the horizon")
+
+    def handle(self, *args, **options):
+        if options["full"]:
+            sync_doctors()
+        extend_horizon()
+        first, last = horizon()
+        self.stdout.write(self.style.SUCCESS(f"Slot calendar covers {first} to {last}"))
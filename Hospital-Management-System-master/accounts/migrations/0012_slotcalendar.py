@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-17 13:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_alter_vitalsrecord_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotCalendar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('status', models.CharField(choices=[('Open', 'Open'), ('Booked', 'Booked')], default='Open', max_length=10)),
+                ('availability', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_slots', to='accounts.doctoravailability')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_slots', to='accounts.doctor')),
+            ],
+            options={
+                'ordering': ['date', 'start_time'],
+                'indexes': [models.Index(fields=['date', 'status', 'start_time'], name='slotcalendar_date_status')],
+                'unique_together': {('doctor', 'date', 'start_time')},
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.6 on 2026-10-17 13:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_slotcalendar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('specialization', models.CharField(blank=True, max_length=100)),
+                ('earliest_date', models.DateField()),
+                ('latest_date', models.DateField()),
+                ('symptoms', models.CharField(blank=True, max_length=1500)),
+                ('status', models.CharField(choices=[('Waiting', 'Waiting'), ('Booked', 'Booked'), ('Withdrawn', 'Withdrawn')], default='Waiting', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='appointment',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'Canceled'), _negated=True), fields=('doctor', 'date', 'start_time'), name='appointment_unique_active_slot'),
+        ),
+        migrations.AddField(
+            model_name='waitlistentry',
+            name='appointment',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='accounts.appointment'),
+        ),
+        migrations.AddField(
+            model_name='waitlistentry',
+            name='doctor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='accounts.doctor'),
+        ),
+        migrations.AddField(
+            model_name='waitlistentry',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='accounts.patient'),
+        ),
+        migrations.AddIndex(
+            model_name='waitlistentry',
+            index=models.Index(fields=['status', 'doctor', 'created_at'], name='waitlist_doctor'),
+        ),
+        migrations.AddIndex(
+            model_name='waitlistentry',
+            index=models.Index(fields=['status', 'specialization', 'created_at'], name='waitlist_specialization'),
+        ),
+    ]
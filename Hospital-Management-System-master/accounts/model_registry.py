@@ -0,0 +1,244 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import joblib
+from django.conf import settings
+
+from .compiled_forest import CompiledForest
+from .ensemble import vote_stats
+from .symptom_index import SymptomIndex
+
+
+# Artifact name -> file name inside the models directory
+MODEL_FILES = {
+    # accounts.ensemble.SymptomEnsemble: all three models, the label encoder
+    # and the symptom encoder in one pickle (written by train.py)
+    "ensemble": "ensemble.pkl",
+}
+
+# Directory of .npy arrays holding the compiled forest (CompiledForest.save),
+# next to the pickle; memory-mapped at load so workers share its pages
+COMPILED_FOREST_DIR = "compiled_rf"
+
+def _source_stamp(path):
+    """(mtime_ns, size) of the pickle a compiled forest was built from."""
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def write_compiled_forest(artifact_dir, rf):
+    """
+    Compile rf and save its arrays to artifact_dir/compiled_rf, stamped with
+    the ensemble pickle they came from.
+
+    The arrays are written to a temporary directory first and renamed into
+    place, so a process loading them never sees half of them. Returns the
+    compiled forest, memory-mapped from the new files.
+    """
+    compiled_dir = os.path.join(artifact_dir, COMPILED_FOREST_DIR)
+    source = _source_stamp(os.path.join(artifact_dir, MODEL_FILES["ensemble"]))
+    tmp_dir = tempfile.mkdtemp(prefix=f".{COMPILED_FOREST_DIR}-", dir=artifact_dir)
+    try:
+        CompiledForest.from_sklearn(rf).save(tmp_dir)
+        with open(os.path.join(tmp_dir, "source.json"), "w") as f:
+            json.dump(source, f)
+        if os.path.isdir(compiled_dir):
+            # Stale arrays of a replaced pickle; processes still mapping them keep their pages
+            stale_dir = tempfile.mkdtemp(prefix=f".{COMPILED_FOREST_DIR}-stale-", dir=artifact_dir)
+            os.replace(compiled_dir, os.path.join(stale_dir, COMPILED_FOREST_DIR))
+            shutil.rmtree(stale_dir, ignore_errors=True)
+        os.rename(tmp_dir, compiled_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # Another process may have just written them
+        if not os.path.isdir(compiled_dir):
+            raise
+    return CompiledForest.load(compiled_dir, mmap_mode="r")
+
+
+def load_compiled_forest(artifact_dir, rf):
+    """
+    The compiled forest of the artifacts in artifact_dir, memory-mapped.
+
+    The arrays are written on first use when missing or stale (train.py
+    writes them for every version it publishes). If the directory can't be
+    written to, the forest is compiled into this process's memory instead.
+    """
+    compiled_dir = os.path.join(artifact_dir, COMPILED_FOREST_DIR)
+    try:
+        with open(os.path.join(compiled_dir, "source.json")) as f:
+            source = json.load(f)
+        if source == _source_stamp(os.path.join(artifact_dir, MODEL_FILES["ensemble"])):
+            return CompiledForest.load(compiled_dir, mmap_mode="r")
+    except (OSError, ValueError):
+        pass
+    try:
+        return write_compiled_forest(artifact_dir, rf)
+    except OSError:
+        return CompiledForest.from_sklearn(rf)
+
+
+# models/CURRENT names the active models/versions/<version>/ directory (see train.py)
+CURRENT_POINTER = "CURRENT"
+VERSIONS_DIR = "versions"
+
+
+class ModelBundle:
+    """A consistent set of loaded prediction artifacts."""
+
+    def __init__(self, artifacts, version, signature, compiled_rf=None, manifest=None):
+        self.ensemble = artifacts["ensemble"]
+        self.rf = self.ensemble.rf
+        self.nb = self.ensemble.nb
+        self.svm = self.ensemble.svm
+        self.encoder = self.ensemble.label_encoder
+        self.symptom_encoder = self.ensemble.symptom_encoder
+        self.symptom_index = SymptomIndex(self.symptom_encoder.symptoms)
+        # Array-compiled copy of the forest: same predictions, much lower
+        # per-call overhead (None when PREDICTION_COMPILED_FOREST is off).
+        self.compiled_rf = compiled_rf
+        self.version = version
+        self.signature = signature
+        # manifest.json written by train.py, if the artifacts came from a versioned directory
+        self.manifest = manifest
+
+    def forest_for(self, n_rows):
+        """
+        The forest implementation to use for a batch of n_rows.
+
+        The compiled forest wins for single rows and small batches; past
+        PREDICTION_COMPILED_FOREST_MAX_ROWS sklearn's Cython traversal is faster.
+        """
+        max_rows = getattr(settings, "PREDICTION_COMPILED_FOREST_MAX_ROWS", 256)
+        if self.compiled_rf is not None and n_rows <= max_rows:
+            return self.compiled_rf
+        return self.rf
+
+    def predict_encoded(self, X, top_k=0):
+        """
+        Run the fused ensemble on encoded rows, using the compiled forest where it is faster.
+
+        With PREDICTION_FAST_VOTE the ensemble takes a hard majority vote and
+        skips the most expensive model (by measured cost) wherever the other two agree.
+        """
+        return self.ensemble.predict_encoded(
+            X, top_k,
+            overrides={"rf": self.forest_for(X.shape[0])},
+            fast_vote=getattr(settings, "PREDICTION_FAST_VOTE", False),
+            stats=vote_stats,
+        )
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the disease-prediction models.
+
+    Nothing is read from disk until the first call to get(). The pickle is
+    loaded into each process's own memory (sklearn copies tree and SVC arrays
+    while unpickling, so mapping it would share nothing). The compiled forest,
+    the largest structure, is memory-mapped from the .npy files next to the
+    pickle (written by train.py, or by the first process to load a version
+    without them), so workers serving the same version share its pages
+    through the page cache. Every `check_interval` seconds
+    get() stats the files and swaps in a freshly loaded bundle when they
+    changed on disk.
+
+    When models/CURRENT exists the artifacts are read from the versioned
+    directory it names, so train.py can publish a new version by flipping
+    that pointer without touching files that are currently mapped.
+    """
+
+    def __init__(self, models_dir=None, check_interval=None):
+        self._models_dir = models_dir
+        self._check_interval = check_interval
+        self._bundle = None
+        self._last_check = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def models_dir(self):
+        if self._models_dir is not None:
+            return str(self._models_dir)
+        return str(getattr(settings, "PREDICTION_MODELS_DIR", settings.BASE_DIR / "models"))
+
+    @property
+    def check_interval(self):
+        if self._check_interval is not None:
+            return self._check_interval
+        return getattr(settings, "PREDICTION_MODELS_CHECK_INTERVAL", 2)
+
+    def artifact_dir(self):
+        """Directory holding the active artifacts."""
+        try:
+            with open(os.path.join(self.models_dir, CURRENT_POINTER)) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return self.models_dir
+        return os.path.join(self.models_dir, VERSIONS_DIR, version)
+
+    def path(self, name, artifact_dir=None):
+        return os.path.join(artifact_dir or self.artifact_dir(), MODEL_FILES[name])
+
+    def _signature(self):
+        """Artifact directory plus (mtime, size) of every artifact; changes whenever one is replaced."""
+        artifact_dir = self.artifact_dir()
+        signature = [artifact_dir]
+        for name in MODEL_FILES:
+            stat = os.stat(self.path(name, artifact_dir))
+            signature.append((name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _load(self, signature):
+        artifact_dir = signature[0]
+        artifacts = {name: joblib.load(self.path(name, artifact_dir)) for name in MODEL_FILES}
+        try:
+            with open(os.path.join(artifact_dir, "manifest.json")) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = None
+        self._version += 1
+        compiled_rf = None
+        if getattr(settings, "PREDICTION_COMPILED_FOREST", False):
+            compiled_rf = load_compiled_forest(artifact_dir, artifacts["ensemble"].rf)
+        return ModelBundle(artifacts, self._version, signature, compiled_rf, manifest)
+
+    def get(self):
+        """Return the current ModelBundle, loading or reloading it if needed."""
+        bundle = self._bundle
+        now = time.monotonic()
+        if bundle is not None and now - self._last_check < self.check_interval:
+            return bundle
+
+        with self._lock:
+            if self._bundle is not None and now - self._last_check < self.check_interval:
+                return self._bundle
+            try:
+                signature = self._signature()
+            except FileNotFoundError:
+                # A deploy may be mid-copy; keep serving what we have.
+                if self._bundle is None:
+                    raise
+                return self._bundle
+            if self._bundle is None or signature != self._bundle.signature:
+                self._bundle = self._load(signature)
+            self._last_check = now
+            return self._bundle
+
+    @property
+    def version(self):
+        """Version of the loaded bundle (0 if nothing is loaded yet)."""
+        return self._bundle.version if self._bundle is not None else 0
+
+    def reset(self):
+        """Drop the loaded bundle so the next get() reloads from disk."""
+        with self._lock:
+            self._bundle = None
+            self._last_check = 0.0
+
+
+registry = ModelRegistry()
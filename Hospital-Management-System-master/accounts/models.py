@@ -1,11 +1,13 @@
-import random
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.exceptions import ValidationError
+import secrets
 import uuid
 from django.utils import timezone
 import datetime
 
+from .sequences import next_value
+
 
 
 # Custom User Manager
@@ -75,9 +77,15 @@ class Nurse(models.Model):
     def __str__(self):
         return f"Nurse: {self.user.first_name} {self.user.last_name} ({self.shift})"
     
+def highest_number(queryset, field, start, end):
+    """Highest counter embedded at [start:end] in `field` of existing rows, seeding a new Sequence."""
+    last = queryset.aggregate(last=models.Max(field))["last"]
+    return int(last[start:end]) if last else 0
+
+
 def generate_doctor_number():
-    count = Doctor.objects.count() + 1
-    return f"DOC{count:04d}2025"
+    number = next_value("doctor", lambda: highest_number(Doctor.objects, "doctor_number", 3, -4))
+    return f"DOC{number:04d}2025"
 
 # Doctor model
 class Doctor(models.Model):
@@ -107,8 +115,8 @@ class Doctor(models.Model):
 
 # Function to generate admission number for the Patient model
 def generate_admission_number():
-    count = Patient.objects.count() + 1
-    return f"PAT{count:04d}2025"
+    number = next_value("patient", lambda: highest_number(Patient.objects, "admission_number", 3, -4))
+    return f"PAT{number:04d}2025"
 
 # Patient model
 class Patient(models.Model):
@@ -125,6 +133,15 @@ class Patient(models.Model):
         return f"Patient: {self.user.first_name} {self.user.last_name} ({self.phone_number}, {self.admission_number})"
     
     
+def appointment_sequence(doctor_id, date):
+    """Name of the per-doctor, per-day Sequence numbering appointment ids."""
+    return f"appointment:{doctor_id}:{date:%Y%m%d}"
+
+
+def appointment_id(doctor_number, date, counter):
+    return f"{doctor_number}-{date:%Y%m%d}-{counter:03d}"
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = [
         ('Pending', 'Pending'),
@@ -149,7 +166,14 @@ class Appointment(models.Model):
 
     class Meta:
         ordering = ['-date', 'start_time']
-        unique_together = ('doctor', 'date', 'start_time')
+        constraints = [
+            # A canceled appointment gives its slot back
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'start_time'],
+                condition=~models.Q(status='Canceled'),
+                name='appointment_unique_active_slot',
+            ),
+        ]
 
     def __str__(self):
         start_time_str = self.start_time.strftime("%H:%M:%S") if self.start_time else "TBD"
@@ -164,9 +188,9 @@ class Appointment(models.Model):
         if self.start_time and self.end_time and self.end_time <= self.start_time:
             raise ValueError("End time must be after start_time.")
 
-        # Auto-assign a random nurse when status changes to Confirmed
+        # Auto-assign a nurse when status changes to Confirmed
         if self.status == "Confirmed" and not self.nurse:
-            self.assign_random_nurse()
+            self.assign_nurse()
 
         super().save(*args, **kwargs)
 
@@ -177,9 +201,19 @@ class Appointment(models.Model):
             except ValueError:
                 raise ValidationError("Date format is invalid; expected YYYY-MM-DD.")
 
-        counter = Appointment.objects.filter(doctor=self.doctor, date=self.date).count() + 1
-        date_str = self.date.strftime("%Y%m%d")
-        return f"{self.doctor.doctor_number}-{date_str}-{counter:03d}"
+        # Seeded from the day's existing ids the first time the day is used
+        prefix = f"{self.doctor.doctor_number}-{self.date:%Y%m%d}-"
+        existing = Appointment.objects.filter(doctor=self.doctor, date=self.date)
+        counter = next_value(
+            appointment_sequence(self.doctor_id, self.date),
+            lambda: highest_number(existing, 'appointment_id', len(prefix), None),
+        )
+        return appointment_id(self.doctor.doctor_number, self.date, counter)
+
+    @classmethod
+    def holding_slots(cls):
+        """Appointments that occupy their time slot (timed and not canceled)."""
+        return cls.objects.filter(start_time__isnull=False).exclude(status='Canceled')
 
     def is_upcoming(self):
         now = timezone.now().date()
@@ -189,11 +223,13 @@ class Appointment(models.Model):
         now = timezone.now().date()
         return self.date < now
 
-    def assign_random_nurse(self):
-        """Assign a random available nurse to this appointment."""
-        nurses = Nurse.objects.all()
-        if nurses.exists():
-            self.nurse = random.choice(nurses)
+    def assign_nurse(self):
+        """Assign the least-loaded nurse on shift at the appointment's time."""
+        from .nurse_assignment import nurse_index
+
+        nurse_id = nurse_index.pick(self.date, self.start_time, self.end_time)
+        if nurse_id is not None:
+            self.nurse_id = nurse_id
     
     
 class DoctorAvailability(models.Model):
@@ -239,6 +275,39 @@ class DoctorAvailability(models.Model):
         return f"{self.doctor.user.username} - {self.day}: {self.start_time} to {self.end_time}"
     
     
+class SlotCalendar(models.Model):
+    """
+    Concrete dated appointment slots over a rolling horizon, derived from the
+    weekly DoctorAvailability rules and the booked appointments.
+
+    Maintained by accounts.slot_calendar; don't edit rows by hand.
+    """
+    OPEN = 'Open'
+    BOOKED = 'Booked'
+    STATUS_CHOICES = [
+        (OPEN, 'Open'),
+        (BOOKED, 'Booked'),
+    ]
+
+    doctor = models.ForeignKey('Doctor', on_delete=models.CASCADE, related_name='calendar_slots')
+    availability = models.ForeignKey('DoctorAvailability', on_delete=models.CASCADE, related_name='calendar_slots')
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OPEN)
+
+    class Meta:
+        ordering = ['date', 'start_time']
+        unique_together = ('doctor', 'date', 'start_time')
+        indexes = [
+            # "Who is free on date X" is a range scan on this index
+            models.Index(fields=['date', 'status', 'start_time'], name='slotcalendar_date_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor.user.username} - {self.date} {self.start_time}-{self.end_time} ({self.status})"
+
+
 class VitalsRecord(models.Model):
     """Model to store patient vitals recorded by the assigned nurse."""
     appointment = models.OneToOneField(
@@ -268,3 +337,78 @@ class VitalsRecord(models.Model):
         else:
             raise ValueError("Vitals can only be recorded if an appointment has an assigned nurse.")
         super().save(*args, **kwargs)
+
+
+class WaitlistEntry(models.Model):
+    """
+    A patient waiting for a slot with a doctor, or with any doctor of a
+    specialization, between two dates. accounts.waitlist books freed slots
+    for the oldest matching entry.
+    """
+    WAITING = 'Waiting'
+    BOOKED = 'Booked'
+    WITHDRAWN = 'Withdrawn'
+    STATUS_CHOICES = [
+        (WAITING, 'Waiting'),
+        (BOOKED, 'Booked'),
+        (WITHDRAWN, 'Withdrawn'),
+    ]
+
+    patient = models.ForeignKey('Patient', on_delete=models.CASCADE, related_name='waitlist_entries')
+    doctor = models.ForeignKey('Doctor', on_delete=models.CASCADE, null=True, blank=True, related_name='waitlist_entries')
+    specialization = models.CharField(max_length=100, blank=True)
+    earliest_date = models.DateField()
+    latest_date = models.DateField()
+    symptoms = models.CharField(max_length=1500, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=WAITING)
+    appointment = models.OneToOneField('Appointment', on_delete=models.SET_NULL, null=True, blank=True, related_name='waitlist_entry')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Matching a freed slot: waiting entries for the doctor, or for
+            # its specialization, oldest first
+            models.Index(fields=['status', 'doctor', 'created_at'], name='waitlist_doctor'),
+            models.Index(fields=['status', 'specialization', 'created_at'], name='waitlist_specialization'),
+        ]
+
+    def clean(self):
+        if not self.doctor_id and not self.specialization:
+            raise ValidationError("Choose a doctor or a specialization.")
+        if self.earliest_date > self.latest_date:
+            raise ValidationError("The earliest date must not be after the latest date.")
+
+    def __str__(self):
+        target = self.doctor or self.specialization
+        return f"{self.patient} waiting for {target} ({self.earliest_date} to {self.latest_date}, {self.status})"
+
+
+class Sequence(models.Model):
+    """A named counter for ids and numbers, advanced by accounts.sequences."""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+def generate_feed_token():
+    return secrets.token_urlsafe(32)
+
+
+class CalendarFeed(models.Model):
+    """
+    A doctor's or nurse's iCalendar feed of their appointments, addressed by
+    a secret token. accounts.calendar_feeds caches the rendered feed in
+    `body` and regenerates it only when `changed_at` (bumped whenever one of
+    the person's appointments changes) is newer than `generated_at`.
+    """
+    user = models.OneToOneField('accounts.Profile', on_delete=models.CASCADE, related_name='calendar_feed')
+    token = models.CharField(max_length=64, unique=True, default=generate_feed_token)
+    changed_at = models.DateTimeField(default=timezone.now)
+    generated_at = models.DateTimeField(null=True, blank=True)
+    body = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Calendar feed of {self.user.username}"
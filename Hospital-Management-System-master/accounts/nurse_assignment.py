@@ -0,0 +1,194 @@
+import datetime
+import heapq
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from .calendar_feeds import touch_feeds
+from .slots import to_minute
+
+
+# Nurse.shift is free text; these names map to time windows, anything else
+# is read as time ranges ("09:00-17:00", "9am to 5pm, 8pm-11pm")
+SHIFT_WINDOWS = {
+    "morning": ("06:00", "14:00"),
+    "day": ("08:00", "20:00"),
+    "afternoon": ("12:00", "20:00"),
+    "evening": ("14:00", "22:00"),
+    "night": ("22:00", "06:00"),
+}
+
+ALL_DAY = ((0, 24 * 60),)
+
+_TIME = r"\d{1,2}(?:[:.]\d{2})?\s*(?:am|pm)?"
+_RANGE = re.compile(rf"({_TIME})\s*(?:-|–|to)\s*({_TIME})")
+
+
+def _minute(value):
+    match = re.fullmatch(r"(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)?", value.strip())
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem == "pm" else 0)
+    return min(hour * 60 + minute, 24 * 60)
+
+
+def _windows(start, end):
+    # Shifts that end at or before their start run past midnight
+    if end > start:
+        return [(start, end)]
+    return [(start, 24 * 60), (0, end)] if end else [(start, 24 * 60)]
+
+
+def parse_shift(shift):
+    """
+    Minute-of-day windows (start, end) a nurse's shift covers, sorted.
+
+    Unrecognised shifts count as all day, so such nurses still get
+    assignments as they did before shifts were taken into account.
+    """
+    text = (shift or "").lower()
+    windows = []
+    for start, end in _RANGE.findall(text):
+        windows += _windows(_minute(start), _minute(end))
+    text = _RANGE.sub(" ", text)
+    for name, (start, end) in SHIFT_WINDOWS.items():
+        if re.search(rf"\b{name}\b", text):
+            windows += _windows(to_minute(datetime.time.fromisoformat(start)),
+                                to_minute(datetime.time.fromisoformat(end)))
+    return tuple(sorted(set(windows))) or ALL_DAY
+
+
+def covers(windows, start, end):
+    return any(window_start <= start and end <= window_end for window_start, window_end in windows)
+
+
+class NurseAssignmentIndex:
+    """
+    Least-loaded on-shift nurse for an appointment, from memory.
+
+    Nurses are grouped by their parsed shift windows (one query). For each
+    date in use, one aggregate query counts every nurse's active
+    appointments that day, and each shift group keeps a min-heap of
+    (load, nurse id). A pick compares the heads of the groups on shift at
+    the appointment's time, then bumps the chosen nurse's load in place:
+    O(groups + log n), with a handful of groups.
+
+    Picks made here are counted immediately; other changes (cancellations,
+    manual reassignments, other processes' picks) are picked up after
+    NURSE_ASSIGNMENT_TTL seconds. Nurse changes call invalidate().
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._groups = None
+        self._days = {}
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "NURSE_ASSIGNMENT_TTL", 60)
+
+    def invalidate(self):
+        with self._lock:
+            self._groups = None
+            self._days = {}
+
+    def _build_groups(self):
+        from .models import Nurse
+
+        groups = {}
+        for nurse_id, shift in Nurse.objects.values_list("id", "shift"):
+            groups.setdefault(parse_shift(shift), []).append(nurse_id)
+        return groups
+
+    def _load_days(self, dates, now):
+        """Make sure every date has fresh heaps, counting the missing dates' loads in one query."""
+        from .models import Appointment
+
+        if self._groups is None or now - self._built_at > self.ttl:
+            self._groups = self._build_groups()
+            self._days = {}
+            self._built_at = now
+        self._days = {date: day for date, day in self._days.items() if now - day[0] <= self.ttl}
+        missing = {date for date in dates if date not in self._days}
+        if not missing:
+            return
+        loads = {date: {} for date in missing}
+        for date, nurse_id, count in (
+            Appointment.objects.filter(date__in=missing, nurse__isnull=False).exclude(status="Canceled")
+            .values("date", "nurse").annotate(count=Count("id")).values_list("date", "nurse", "count")
+        ):
+            loads[date][nurse_id] = count
+        for date in missing:
+            heaps = {}
+            for windows, nurse_ids in self._groups.items():
+                heap = [(loads[date].get(nurse_id, 0), nurse_id) for nurse_id in nurse_ids]
+                heapq.heapify(heap)
+                heaps[windows] = heap
+            self._days[date] = (now, heaps)
+
+    def _pick(self, heaps, start_time, end_time):
+        if not heaps:
+            return None
+        candidates = list(heaps.items())
+        if start_time is not None:
+            start = to_minute(start_time)
+            end = to_minute(end_time) if end_time else start + 1
+            on_shift = [(windows, heap) for windows, heap in candidates if covers(windows, start, end)]
+            # Nobody on shift: fall back to the least-loaded nurse overall
+            candidates = on_shift or candidates
+        _, heap = min(candidates, key=lambda candidate: candidate[1][0])
+        load, nurse_id = heap[0]
+        heapq.heapreplace(heap, (load + 1, nurse_id))
+        return nurse_id
+
+    def pick(self, date, start_time=None, end_time=None):
+        """Nurse id to assign to an appointment on date at start-end (None if there are no nurses)."""
+        return self.pick_many([(date, start_time, end_time)])[0]
+
+    def pick_many(self, slots):
+        """Nurse ids for many (date, start_time, end_time) slots in one pass, balancing across them too."""
+        slots = [
+            (datetime.date.fromisoformat(date) if isinstance(date, str) else date, start, end)
+            for date, start, end in slots
+        ]
+        with self._lock:
+            self._load_days({date for date, _, _ in slots}, time.monotonic())
+            return [self._pick(self._days[date][1], start, end) for date, start, end in slots]
+
+
+nurse_index = NurseAssignmentIndex()
+
+
+def confirm_appointments(appointments):
+    """
+    Confirm appointments in bulk: every one still without a nurse gets the
+    least-loaded on-shift nurse in a single pass, and all are written with
+    one bulk update. Returns the number confirmed.
+    """
+    from .models import Appointment
+
+    appointments = [appointment for appointment in appointments if appointment.status == "Pending"]
+    unassigned = [appointment for appointment in appointments if not appointment.nurse_id]
+    for appointment, nurse_id in zip(
+        unassigned,
+        nurse_index.pick_many([(appointment.date, appointment.start_time, appointment.end_time)
+                               for appointment in unassigned]),
+    ):
+        appointment.nurse_id = nurse_id
+    now = timezone.now()
+    for appointment in appointments:
+        appointment.status, appointment.updated_at = "Confirmed", now
+    Appointment.objects.bulk_update(appointments, ["status", "nurse", "updated_at"], batch_size=500)
+    touch_feeds(
+        doctor_ids=[appointment.doctor_id for appointment in appointments],
+        nurse_ids=[appointment.nurse_id for appointment in appointments],
+    )
+    return len(appointments)
@@ -0,0 +1,130 @@
+import datetime
+
+import numpy as np
+
+from .doctor_routing import WEEKDAYS
+from .slots import slot_minutes, to_minute, to_time
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def _percent(booked, available):
+    """booked / available as percentages (1 decimal), None where nothing was available."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.round(100 * booked / available, 1)
+    return np.where(available > 0, ratio, np.nan)
+
+
+def _listed(array):
+    return [None if np.isnan(value) else float(value) for value in np.ravel(array)]
+
+
+def _minute_spans(shape, rows, starts, ends):
+    """
+    Boolean array of `shape` (..., minutes of the day) with each [start, end)
+    span set at its row index: +1/-1 at the span edges, then a cumulative sum.
+    """
+    edges = np.zeros(shape[:-1] + (MINUTES_PER_DAY + 1,), dtype=np.int32)
+    np.add.at(edges, rows + (starts,), 1)
+    np.add.at(edges, rows + (ends,), -1)
+    return np.cumsum(edges, axis=-1)[..., :MINUTES_PER_DAY] > 0
+
+
+def occupancy_matrix(first, last):
+    """
+    How full every approved doctor is between first and last (inclusive).
+
+    One query per table (doctors, availabilities, appointments) fills minute
+    resolution arrays of shape doctors x days x minutes: what is available
+    from the weekly rules and what the non-canceled appointments hold. They
+    are summed into APPOINTMENT_SLOT_MINUTES cells, and utilisation (booked
+    share of available time) per doctor, specialization, day and doctor-day
+    comes from reductions over those arrays.
+    """
+    from .models import Appointment, Doctor, DoctorAvailability
+
+    dates = [first + datetime.timedelta(days=offset) for offset in range((last - first).days + 1)]
+    doctors = list(
+        Doctor.objects.filter(status="Approved", is_approved=True)
+        .order_by("specialization", "id")
+        .values_list("id", "user__first_name", "user__last_name", "specialization")
+    )
+    index = {doctor_id: row for row, (doctor_id, _, _, _) in enumerate(doctors)}
+    shape = (len(doctors), len(dates), MINUTES_PER_DAY)
+
+    weekly = np.zeros((len(doctors), 7, MINUTES_PER_DAY), dtype=bool)
+    rules = list(
+        DoctorAvailability.objects.filter(doctor_id__in=index).values_list("doctor_id", "day", "start_time", "end_time")
+    )
+    if rules:
+        doctor_rows, weekdays, starts, ends = zip(*(
+            (index[doctor_id], WEEKDAYS.index(day), to_minute(start), to_minute(end))
+            for doctor_id, day, start, end in rules
+        ))
+        weekly = _minute_spans(weekly.shape, (np.array(doctor_rows), np.array(weekdays)), np.array(starts), np.array(ends))
+    available = weekly[:, [date.weekday() for date in dates], :]
+
+    booked = np.zeros(shape, dtype=bool)
+    length = slot_minutes()
+    appointments = list(
+        Appointment.holding_slots().filter(doctor_id__in=index, date__range=(first, last))
+        .values_list("doctor_id", "date", "start_time", "end_time")
+    )
+    if appointments:
+        doctor_rows, days, starts, ends = zip(*(
+            (index[doctor_id], (date - first).days, to_minute(start),
+             to_minute(end) if end else to_minute(start) + length)
+            for doctor_id, date, start, end in appointments
+        ))
+        starts, ends = np.array(starts), np.array(ends)
+        # Appointments ending at or past midnight run to the end of the day
+        ends = np.where(ends <= starts, MINUTES_PER_DAY, np.minimum(ends, MINUTES_PER_DAY))
+        booked = _minute_spans(shape, (np.array(doctor_rows), np.array(days)), starts, ends)
+    # Time booked outside the doctor's availability doesn't count
+    booked &= available
+
+    cell = length if MINUTES_PER_DAY % length == 0 else 60
+    cells = MINUTES_PER_DAY // cell
+    available_cells = available.reshape(shape[:2] + (cells, cell)).sum(axis=-1)
+    booked_cells = booked.reshape(shape[:2] + (cells, cell)).sum(axis=-1)
+
+    # Only the part of the day anybody works
+    open_cells = np.flatnonzero(available_cells.any(axis=(0, 1)))
+    columns = slice(open_cells[0], open_cells[-1] + 1) if open_cells.size else slice(0, 0)
+    available_cells, booked_cells = available_cells[..., columns], booked_cells[..., columns]
+
+    doctor_available, doctor_booked = available_cells.sum(axis=(1, 2)), booked_cells.sum(axis=(1, 2))
+    specializations, groups = np.unique([doctor[3] for doctor in doctors], return_inverse=True)
+    specialization_available = np.bincount(groups, weights=doctor_available, minlength=len(specializations))
+    specialization_booked = np.bincount(groups, weights=doctor_booked, minlength=len(specializations))
+    doctor_day_percent = _percent(booked_cells.sum(axis=2), available_cells.sum(axis=2))
+    occupancy = _percent(booked_cells, available_cells)
+    return {
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "slot_minutes": cell,
+        "days": [date.isoformat() for date in dates],
+        "slots": [to_time(minute).strftime("%H:%M") for minute in range(0, MINUTES_PER_DAY, cell)][columns],
+        "doctors": [
+            {
+                "id": doctor_id,
+                "name": f"Dr. {first_name} {last_name}".strip(),
+                "specialization": specialization,
+                "utilisation": percent,
+                "days": _listed(doctor_day_percent[row]),
+                # Booked percentage of every slot, day by day (None: not available)
+                "slots": [_listed(day) for day in occupancy[row]],
+            }
+            for row, ((doctor_id, first_name, last_name, specialization), percent) in enumerate(
+                zip(doctors, _listed(_percent(doctor_booked, doctor_available)))
+            )
+        ],
+        "specializations": dict(zip(
+            (str(name) for name in specializations), _listed(_percent(specialization_booked, specialization_available))
+        )),
+        "days_utilisation": dict(zip(
+            (date.isoformat() for date in dates),
+            _listed(_percent(booked_cells.sum(axis=(0, 2)), available_cells.sum(axis=(0, 2)))),
+        )),
+        "utilisation": _listed(_percent(np.array(booked_cells.sum()), np.array(available_cells.sum())))[0],
+    }
@@ -1,38 +1,77 @@
-import numpy as np
-import joblib
-import pandas as pd
-
-# Load trained models
-svm_model = joblib.load("models/svm_model.pkl")
-nb_model = joblib.load("models/nb_model.pkl")
-rf_model = joblib.load("models/rf_model.pkl")
-encoder = joblib.load("models/label_encoder.pkl")
-
-# Load symptom index mapping
-symptoms = list(pd.read_csv("dataset.csv").columns)[:-1]
-symptom_index = {symptom: idx for idx, symptom in enumerate(symptoms)}
-
-def predict_disease(user_symptoms):
-    input_data = [0] * len(symptom_index)
-    
-    for symptom in user_symptoms.split(","):
-        if symptom in symptom_index:
-            input_data[symptom_index[symptom]] = 1
-
-    input_data = np.array(input_data).reshape(1, -1)
-
-    # Predictions
-    rf_pred = encoder.inverse_transform([rf_model.predict(input_data)[0]])[0]
-    nb_pred = encoder.inverse_transform([nb_model.predict(input_data)[0]])[0]
-    svm_pred = encoder.inverse_transform([svm_model.predict(input_data)[0]])[0]
-
-    # Final prediction using mode
-    from statistics import mode
-    final_prediction = mode([rf_pred, nb_pred, svm_pred])
-
-    return {
-        "Random Forest": rf_pred,
-        "Naive Bayes": nb_pred,
-        "SVM": svm_pred,
-        "Final Prediction": final_prediction
-    }
\ No newline at end of file
+from django.conf import settings
+
+from .inference_pool import inference_pool
+from .model_registry import registry
+from .prediction_cache import prediction_cache, symptom_key
+
+
+def get_symptoms():
+    """Symptom vocabulary, in model column order."""
+    return registry.get().symptom_encoder.symptoms
+
+
+def search_symptoms(text, limit=10):
+    """Typeahead suggestions (canonical names) for partially typed text."""
+    return registry.get().symptom_index.search(text, limit)
+
+
+def predict_batch(symptom_sets, top_k=0):
+    """
+    Predict diseases for many symptom sets at once.
+
+    The batch is encoded once and run through the fused soft-voting ensemble
+    (accounts.ensemble), so every model is called once per batch instead of
+    once per row. Identical rows are computed once, and rows already in the
+    prediction cache are answered from it and left out of the model calls.
+    With top_k > 0 every result also lists the top_k diseases with their
+    scores.
+    """
+    if not symptom_sets:
+        return []
+
+    models = registry.get()
+    # Map free-typed names ("Skin Rash", "spotting urination") onto the vocabulary
+    known = models.symptom_encoder.index
+    symptom_sets = [models.symptom_index.resolve_all(symptoms, known) for symptoms in symptom_sets]
+    if len(symptom_sets) == 1:
+        input_data = models.symptom_encoder.encode(symptom_sets[0])
+    else:
+        input_data = models.symptom_encoder.encode_batch(symptom_sets)
+
+    keys = [(symptom_key(row), top_k) for row in input_data]
+    # Repeated symptom sets are looked up and predicted once per batch:
+    # key -> first row carrying it
+    first_rows = {}
+    for row, key in enumerate(keys):
+        first_rows.setdefault(key, row)
+
+    answers = {}
+    missing = []
+    for key, row in first_rows.items():
+        answers[key] = prediction_cache.get(key, models.version)
+        if answers[key] is None:
+            missing.append(row)
+
+    if missing:
+        for row, result in zip(missing, models.predict_encoded(input_data[missing], top_k)):
+            prediction_cache.set(keys[row], models.version, result)
+            answers[keys[row]] = result
+
+    # Hand out copies so callers can't mutate cached entries (or each other's rows)
+    return [dict(answers[key]) for key in keys]
+
+
+def run_prediction(symptom_sets, top_k=0):
+    """
+    predict_batch, either inline or on the worker pool.
+
+    With PREDICTION_EXECUTION_MODE = "pool" this may raise
+    inference_pool.PoolSaturated or inference_pool.PredictionTimeout.
+    """
+    if getattr(settings, "PREDICTION_EXECUTION_MODE", "inline") == "pool":
+        return inference_pool.predict(symptom_sets, top_k)
+    return predict_batch(symptom_sets, top_k)
+
+
+def predict_disease(user_symptoms, top_k=0):
+    return run_prediction([user_symptoms], top_k)[0]
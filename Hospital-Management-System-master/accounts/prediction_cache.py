@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+
+def symptom_key(row):
+    """
+    Canonical cache key for one encoded input row.
+
+    The row is a 0/1 vector over the symptom vocabulary, so packing it into a
+    bitset gives the same key regardless of the order or repetition of the
+    symptoms the user typed.
+    """
+    return np.packbits(np.asarray(row, dtype=bool)).tobytes()
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of prediction results with a per-entry TTL.
+
+    Entries are tagged with the model registry version they were computed
+    with; when a newer version shows up the whole cache is dropped, so hot
+    swapped models never serve stale answers.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is not None:
+            return self._maxsize
+        return getattr(settings, "PREDICTION_CACHE_SIZE", 4096)
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "PREDICTION_CACHE_TTL", 3600)
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        """Return the cached result for key, or None on a miss."""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, version, result):
+        maxsize = self.maxsize
+        if maxsize <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "model_version": self._version,
+        }
+
+
+def merge_stats(snapshots):
+    """
+    Combine the stats() of several processes' caches (the pool's workers):
+    counters and sizes are summed; maxsize and ttl are per process.
+    """
+    hits = sum(stats["hits"] for stats in snapshots)
+    misses = sum(stats["misses"] for stats in snapshots)
+    return {
+        "processes": len(snapshots),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "evictions": sum(stats["evictions"] for stats in snapshots),
+        "size": sum(stats["size"] for stats in snapshots),
+        "maxsize": prediction_cache.maxsize,
+        "ttl": prediction_cache.ttl,
+        # Each process numbers the versions it loaded itself
+        "model_versions": sorted({stats["model_version"] for stats in snapshots if stats["model_version"] is not None}),
+    }
+
+
+prediction_cache = PredictionCache()
@@ -0,0 +1,50 @@
+from django.db import transaction
+
+
+def reserve_many(counts, initial=None):
+    """
+    Reserve `counts[name]` consecutive numbers from each named sequence.
+
+    Two queries in the common case, however many sequences are involved:
+    read the counters with a row lock, write back the advanced values, all
+    in one transaction. Missing counters are created first; a sequence
+    created here starts after `initial(missing_names)[name]` (default 0),
+    so counters introduced over existing data don't hand out numbers
+    already in use.
+
+    Returns {name: range of reserved numbers}.
+    """
+    from .models import Sequence
+
+    counts = {name: count for name, count in counts.items() if count > 0}
+    if not counts:
+        return {}
+    with transaction.atomic():
+        locked = Sequence.objects.select_for_update()
+        sequences = {sequence.name: sequence for sequence in locked.filter(name__in=counts)}
+        missing = [name for name in counts if name not in sequences]
+        if missing:
+            seeds = initial(missing) if initial else {}
+            Sequence.objects.bulk_create(
+                [Sequence(name=name, value=seeds.get(name) or 0) for name in missing], ignore_conflicts=True
+            )
+            sequences.update((sequence.name, sequence) for sequence in locked.filter(name__in=missing))
+        reserved = {}
+        for name, sequence in sequences.items():
+            reserved[name] = range(sequence.value + 1, sequence.value + counts[name] + 1)
+            sequence.value += counts[name]
+        Sequence.objects.bulk_update(sequences.values(), ["value"])
+    return reserved
+
+
+def reserve(name, count, initial=None):
+    """
+    Reserve a block of `count` numbers in one round trip (hi-lo style: the
+    caller hands them out itself), e.g. for bulk imports.
+    """
+    return reserve_many({name: count}, initial and (lambda names: {name: initial()}))[name]
+
+
+def next_value(name, initial=None):
+    """The next number of a sequence; `initial()` seeds it on first use."""
+    return reserve(name, 1, initial)[0]
@@ -0,0 +1,130 @@
+import datetime
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .calendar_feeds import touch_feeds
+from .doctor_routing import routing_index
+from .models import Appointment, Doctor, DoctorAvailability, Nurse, Profile
+from .nurse_assignment import nurse_index
+from .slot_calendar import is_sync_suspended, sync_doctors
+from .waitlist import backfill_slot
+
+
+# Fields the routing index reads; saves that change none of them keep the index
+ROUTING_FIELDS = {
+    Doctor: ("status", "is_approved", "specialization", "experience"),
+    # The index shows doctors' names
+    Profile: ("first_name", "last_name"),
+}
+
+
+def _routing_values(sender, instance):
+    return tuple(getattr(instance, field) for field in ROUTING_FIELDS[sender])
+
+
+def _saves_routing_fields(sender, instance, update_fields):
+    if sender is Profile and instance.user_type != "doctor":
+        return False
+    return update_fields is None or bool(set(update_fields) & set(ROUTING_FIELDS[sender]))
+
+
+@receiver(pre_save, sender=Doctor)
+@receiver(pre_save, sender=Profile)
+def remember_routing_fields(sender, instance, update_fields=None, **kwargs):
+    # Logins save the Profile (last_login) and must not rebuild the index
+    instance._previous_routing = None
+    if instance.pk and _saves_routing_fields(sender, instance, update_fields):
+        instance._previous_routing = sender.objects.filter(pk=instance.pk).values_list(
+            *ROUTING_FIELDS[sender]
+        ).first()
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_save, sender=Profile)
+def refresh_doctor_routing_fields(sender, instance, update_fields=None, **kwargs):
+    """Approvals, specialization and name changes affect who a disease is routed to and how they're shown."""
+    if _saves_routing_fields(sender, instance, update_fields) and (
+        getattr(instance, "_previous_routing", None) != _routing_values(sender, instance)
+    ):
+        routing_index.invalidate()
+
+
+@receiver(post_delete, sender=Doctor)
+@receiver([post_save, post_delete], sender=DoctorAvailability)
+def refresh_doctor_routing(sender, **kwargs):
+    """Removed doctors and schedule changes affect who a disease is routed to."""
+    routing_index.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Nurse)
+def refresh_nurse_assignment(sender, **kwargs):
+    """New nurses and changed shifts take part in the next assignment."""
+    nurse_index.invalidate()
+
+
+@receiver([post_save, post_delete], sender=DoctorAvailability)
+def refresh_slot_calendar_for_availability(sender, instance, **kwargs):
+    """A changed weekly rule regenerates the doctor's dated slots over the whole horizon."""
+    if is_sync_suspended():
+        return
+    doctor_id = instance.doctor_id
+    transaction.on_commit(lambda: sync_doctors([doctor_id]))
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_appointment_day(sender, instance, **kwargs):
+    # A rescheduled appointment frees a slot on the day it moved away from
+    instance._previous_day = None
+    instance._previous_status = None
+    instance._previous_nurse = None
+    if instance.pk:
+        previous = Appointment.objects.filter(pk=instance.pk).values_list(
+            "doctor_id", "date", "status", "nurse_id"
+        ).first()
+        if previous:
+            doctor_id, date, instance._previous_status, instance._previous_nurse = previous
+            instance._previous_day = (doctor_id, date)
+
+
+@receiver([post_save, post_delete], sender=Appointment)
+def refresh_slot_calendar_for_appointment(sender, instance, **kwargs):
+    """Re-derive the open/booked status of the affected doctor-days."""
+    if is_sync_suspended():
+        return
+    date = instance.date
+    if isinstance(date, str):
+        date = datetime.date.fromisoformat(date)
+    days = {(instance.doctor_id, date)}
+    if getattr(instance, "_previous_day", None):
+        days.add(instance._previous_day)
+
+    def sync():
+        for doctor_id, date in days:
+            sync_doctors([doctor_id], [date])
+
+    transaction.on_commit(sync)
+
+
+@receiver(post_save, sender=Appointment)
+def backfill_canceled_slot(sender, instance, **kwargs):
+    """Offer a newly canceled appointment's slot to the first patient on the waitlist."""
+    previous_status = getattr(instance, "_previous_status", None)
+    if instance.status != "Canceled" or previous_status in (None, "Canceled") or not instance.start_time:
+        return
+    doctor, patient_id = instance.doctor, instance.patient_id
+    start_time, end_time = instance.start_time, instance.end_time
+    date = instance.date
+    if isinstance(date, str):
+        date = datetime.date.fromisoformat(date)
+    transaction.on_commit(lambda: backfill_slot(doctor, date, start_time, end_time, exclude_patient_id=patient_id))
+
+
+@receiver([post_save, post_delete], sender=Appointment)
+def refresh_calendar_feeds(sender, instance, **kwargs):
+    """Appointment changes invalidate the cached feeds of its doctors and nurses, old and new."""
+    previous_day = getattr(instance, "_previous_day", None)
+    doctor_ids = [instance.doctor_id, previous_day[0] if previous_day else None]
+    nurse_ids = [instance.nurse_id, getattr(instance, "_previous_nurse", None)]
+    touch_feeds(doctor_ids, nurse_ids)
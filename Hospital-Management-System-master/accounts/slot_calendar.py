@@ -0,0 +1,196 @@
+import datetime
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .slots import DaySlots
+
+
+_state = threading.local()
+
+# Last date of the horizon extend_horizon() filled in this process; the
+# calendar is behind once horizon() ends later (the next day)
+_filled_until = None
+
+
+@contextmanager
+def sync_suspended():
+    """
+    Make the model signals skip calendar syncs on this thread, for bulk
+    writers that sync the affected doctors once themselves afterwards.
+    """
+    previous = getattr(_state, "suspended", False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def is_sync_suspended():
+    return getattr(_state, "suspended", False)
+
+
+def horizon_weeks():
+    return getattr(settings, "SLOT_CALENDAR_WEEKS", 8)
+
+
+def horizon(today=None):
+    """(first, last) date covered by the calendar."""
+    today = today or timezone.localdate()
+    return today, today + datetime.timedelta(weeks=horizon_weeks()) - datetime.timedelta(days=1)
+
+
+def sync_doctors(doctor_ids=None, dates=None):
+    """
+    Bring the SlotCalendar rows of the given doctors (all doctors when None) in
+    line with their availabilities and appointments.
+
+    `dates` limits the work to those dates (default: the whole horizon). Three
+    reads - availabilities, appointments, existing rows - then only the
+    difference is written: new slots bulk-created, changed statuses
+    bulk-updated, vanished slots deleted.
+    """
+    first, last = horizon()
+    if dates is None:
+        dates = [first + datetime.timedelta(days=offset) for offset in range((last - first).days + 1)]
+    dates = sorted(date for date in set(dates) if first <= date <= last)
+    if dates:
+        # Read and write in one transaction so concurrent syncs of the same
+        # doctor-day can't both insert the same slot
+        with transaction.atomic():
+            _sync(doctor_ids, dates)
+
+
+def _sync(doctor_ids, dates):
+    from .models import Appointment, DoctorAvailability, SlotCalendar
+
+    availabilities = DoctorAvailability.objects.all()
+    appointments = Appointment.holding_slots().filter(date__in=dates)
+    existing = SlotCalendar.objects.filter(date__in=dates)
+    if doctor_ids is not None:
+        availabilities = availabilities.filter(doctor_id__in=doctor_ids)
+        appointments = appointments.filter(doctor_id__in=doctor_ids)
+        existing = existing.filter(doctor_id__in=doctor_ids)
+
+    # doctor -> weekday -> [(availability id, start, end)]
+    rules = defaultdict(lambda: defaultdict(list))
+    for availability_id, doctor_id, day, start, end in availabilities.values_list(
+        "id", "doctor_id", "day", "start_time", "end_time"
+    ):
+        rules[doctor_id][day].append((availability_id, start, end))
+    booked = defaultdict(list)
+    for doctor_id, date, start, end in appointments.values_list("doctor_id", "date", "start_time", "end_time"):
+        booked[doctor_id, date].append((start, end))
+
+    wanted = {}
+    for doctor_id, weekly in rules.items():
+        for date in dates:
+            windows = weekly.get(date.strftime("%A"))
+            if not windows:
+                continue
+            day = DaySlots(doctor_id, date, windows, booked.get((doctor_id, date), ()))
+            for start, end, availability_id, free in day.slots():
+                wanted[doctor_id, date, start] = (
+                    availability_id, end, SlotCalendar.OPEN if free else SlotCalendar.BOOKED
+                )
+
+    to_update, to_delete = [], []
+    for row in existing:
+        target = wanted.pop((row.doctor_id, row.date, row.start_time), None)
+        if target is None:
+            to_delete.append(row.id)
+        elif (row.availability_id, row.end_time, row.status) != target:
+            row.availability_id, row.end_time, row.status = target
+            to_update.append(row)
+    to_create = [
+        SlotCalendar(
+            doctor_id=doctor_id, date=date, start_time=start,
+            availability_id=availability_id, end_time=end, status=status,
+        )
+        for (doctor_id, date, start), (availability_id, end, status) in wanted.items()
+    ]
+
+    if to_delete:
+        SlotCalendar.objects.filter(id__in=to_delete).delete()
+    if to_update:
+        SlotCalendar.objects.bulk_update(to_update, ["availability", "end_time", "status"], batch_size=500)
+    if to_create:
+        SlotCalendar.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+
+
+def extend_horizon():
+    """
+    Drop past slots and fill the dates that entered the horizon since the
+    last fill. Run daily (manage.py refresh_slot_calendar); open_slots()
+    also calls it when it finds the calendar behind (see is_behind()).
+    """
+    from .models import SlotCalendar
+
+    global _filled_until
+    first, last = horizon()
+    SlotCalendar.objects.filter(date__lt=first).delete()
+    filled_until = SlotCalendar.objects.aggregate(last=Max("date"))["last"]
+    start = max(first, filled_until + datetime.timedelta(days=1)) if filled_until else first
+    if start <= last:
+        sync_doctors(dates=[start + datetime.timedelta(days=offset) for offset in range((last - start).days + 1)])
+    _filled_until = last
+
+
+def is_behind(last=None):
+    """
+    Whether the horizon moved past the last fill of this process.
+
+    Days without any slot (no doctor works that weekday, no doctors yet)
+    leave no rows, so the rows themselves can't tell a filled empty day from
+    a missing one; this is checked instead, and extend_horizon() runs at most
+    once per process and day.
+    """
+    last = last or horizon()[1]
+    return _filled_until is None or _filled_until < last
+
+
+def open_slots(date, specialization=""):
+    """
+    Open SlotCalendar rows of approved doctors on date, optionally for a
+    specialization; an index range scan on (date, status, start_time).
+    """
+    from .models import SlotCalendar
+
+    first, last = horizon()
+    if first <= date <= last and is_behind(last):
+        extend_horizon()
+
+    slots = SlotCalendar.objects.filter(
+        date=date, status=SlotCalendar.OPEN, doctor__status="Approved", doctor__is_approved=True
+    )
+    if specialization:
+        slots = slots.filter(doctor__specialization__icontains=specialization)
+    return slots
+
+
+def open_days(doctor_ids):
+    """
+    {doctor id: dates with an open slot} over the calendar horizon, in one
+    query; slots of today that already started don't count.
+    """
+    from .models import SlotCalendar
+
+    now = timezone.localtime()
+    first, last = horizon(now.date())
+    if is_behind(last):
+        extend_horizon()
+
+    days = defaultdict(set)
+    for doctor_id, date in (
+        SlotCalendar.objects.filter(doctor_id__in=doctor_ids, date__range=(first, last), status=SlotCalendar.OPEN)
+        .exclude(date=first, start_time__lt=now.time())
+        .values_list("doctor_id", "date").distinct()
+    ):
+        days[doctor_id].add(date)
+    return days
@@ -0,0 +1,223 @@
+import datetime
+import heapq
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+
+class SlotUnavailable(Exception):
+    """Raised when no free slot is left for a booking."""
+
+
+def to_minute(value):
+    """Minute of the day of a datetime.time."""
+    return value.hour * 60 + value.minute
+
+
+def to_time(minute):
+    return datetime.time(minute // 60, minute % 60)
+
+
+def minute_mask(start, end):
+    """Bitmask with bits start..end-1 set (one bit per minute of the day)."""
+    return ((1 << (end - start)) - 1) << start
+
+
+def slot_minutes():
+    return getattr(settings, "APPOINTMENT_SLOT_MINUTES", 30)
+
+
+class DaySlots:
+    """
+    Bookable slots of one doctor on one date, answered in memory.
+
+    The day's DoctorAvailability rows and Appointment rows are loaded with one
+    query each. Every appointment's [start, end) is OR-ed into an occupancy
+    bitmap with one bit per minute of the day; a candidate slot is free when
+    its own minute mask doesn't intersect it. Candidate slots start at each
+    availability's start_time and step by the slot length, as long as the
+    whole slot fits before its end_time.
+
+    Canceled appointments don't occupy their slot; the (doctor, date,
+    start_time) unique constraint only covers the other statuses.
+    """
+
+    def __init__(self, doctor_id, date, availabilities, appointments, slot_length=None):
+        self.doctor_id = doctor_id
+        self.date = date
+        self.slot_length = slot_length or slot_minutes()
+        # (availability id, start minute, end minute), in time order
+        self.availabilities = sorted(
+            (availability_id, to_minute(start), to_minute(end)) for availability_id, start, end in availabilities
+        )
+        self.occupied = 0
+        for start, end in appointments:
+            self.mark_booked(start, end)
+
+    @classmethod
+    def load(cls, doctor, date, slot_length=None):
+        """Read the doctor's availability and appointments for date (two queries)."""
+        from .models import Appointment, DoctorAvailability
+
+        if isinstance(date, str):
+            date = datetime.datetime.strptime(date, "%Y-%m-%d").date()
+        doctor_id = getattr(doctor, "id", doctor)
+        availabilities = DoctorAvailability.objects.filter(
+            doctor_id=doctor_id, day=date.strftime("%A")
+        ).values_list("id", "start_time", "end_time")
+        appointments = Appointment.holding_slots().filter(
+            doctor_id=doctor_id, date=date
+        ).values_list("start_time", "end_time")
+        return cls(doctor_id, date, list(availabilities), list(appointments), slot_length)
+
+    def mark_booked(self, start, end=None):
+        """Record an appointment; without an end time it occupies one slot length."""
+        start_minute = to_minute(start)
+        end_minute = to_minute(end) if end is not None else start_minute + self.slot_length
+        if end_minute <= start_minute:
+            # Runs past midnight
+            end_minute = 24 * 60
+        self.occupied |= minute_mask(start_minute, end_minute)
+
+    def is_free(self, start, end):
+        return not self.occupied & minute_mask(to_minute(start), to_minute(end))
+
+    def _candidates(self, availability_id=None):
+        for candidate_id, start, end in self.availabilities:
+            if availability_id is not None and candidate_id != availability_id:
+                continue
+            for slot_start in range(start, end - self.slot_length + 1, self.slot_length):
+                yield candidate_id, slot_start, slot_start + self.slot_length
+
+    def slots(self, availability_id=None):
+        """Every candidate slot as (start, end, availability id, is free)."""
+        return [
+            (to_time(start), to_time(end), candidate_id, not self.occupied & minute_mask(start, end))
+            for candidate_id, start, end in self._candidates(availability_id)
+        ]
+
+    def free_slots(self, availability_id=None):
+        """Free (start, end, availability id) slots, optionally within one availability."""
+        return [
+            (to_time(start), to_time(end), candidate_id)
+            for candidate_id, start, end in self._candidates(availability_id)
+            if not self.occupied & minute_mask(start, end)
+        ]
+
+    def first_free_slot(self, availability_id=None):
+        """The earliest free (start, end, availability id), or None if the day is full."""
+        for candidate_id, start, end in self._candidates(availability_id):
+            if not self.occupied & minute_mask(start, end):
+                return to_time(start), to_time(end), candidate_id
+        return None
+
+
+def book_first_free_slot(patient, doctor, date, availability_id=None, retries=None, **fields):
+    """
+    Create an appointment in the doctor's first free slot on date.
+
+    The insert runs in its own savepoint. When a concurrent booking wins the
+    slot (IntegrityError on doctor/date/start_time) the slot is marked taken
+    and the next free one is tried, without re-reading the day; when the
+    appointment id was taken instead, the same slot is retried with a new id.
+    Raises SlotUnavailable when the day is full or after
+    APPOINTMENT_BOOKING_RETRIES conflicts.
+    """
+    from .models import Appointment
+
+    retries = retries or getattr(settings, "APPOINTMENT_BOOKING_RETRIES", 20)
+    slots = DaySlots.load(doctor, date)
+    for _ in range(retries):
+        slot = slots.first_free_slot(availability_id)
+        if slot is None:
+            raise SlotUnavailable("No available slots for the selected date.")
+        start, end, _ = slot
+        appointment = Appointment(
+            patient=patient, doctor=doctor, date=slots.date, start_time=start, end_time=end, **fields
+        )
+        try:
+            with transaction.atomic():
+                appointment.save()
+            return appointment
+        except IntegrityError:
+            if Appointment.holding_slots().filter(doctor=doctor, date=slots.date, start_time=start).exists():
+                slots.mark_booked(start, end)
+    raise SlotUnavailable("Too many people are booking this doctor right now. Please try again.")
+
+
+def _doctor_slot_stream(doctor_id, weekly, booked, first, last, not_before=None):
+    """Free (date, start, end, doctor id, availability id) slots of one doctor, in time order."""
+    date = first
+    while date <= last:
+        windows = weekly.get(date.strftime("%A"))
+        if windows:
+            day = DaySlots(doctor_id, date, windows, booked.get(date, ()))
+            for start, end, availability_id in day.free_slots():
+                if not_before is None or (date, start) >= not_before:
+                    yield date, start, end, doctor_id, availability_id
+        date += datetime.timedelta(days=1)
+
+
+def earliest_free_slots(specialization, first, last, limit=10, now=None):
+    """
+    The `limit` earliest free slots between first and last (inclusive) across
+    all approved doctors whose specialization contains `specialization`.
+
+    Two queries - the doctors' weekly availability and their appointments in
+    the range - then every doctor becomes a lazy, time-ordered stream of free
+    slots and heapq.merge() takes the first `limit` of all streams together,
+    so days past the answer are never expanded. Slots that already started
+    (before `now`) are skipped.
+
+    Returns dicts with date, start, end, doctor id/name/specialization and
+    availability id.
+    """
+    from .models import Appointment, DoctorAvailability
+
+    now = now or timezone.localtime()
+    not_before = (now.date(), now.time().replace(second=0, microsecond=0))
+    first = max(first, now.date())
+
+    rules = defaultdict(lambda: defaultdict(list))
+    doctors = {}
+    for availability_id, doctor_id, day, start, end, first_name, last_name, doctor_specialization in (
+        DoctorAvailability.objects.filter(
+            doctor__status="Approved", doctor__is_approved=True,
+            doctor__specialization__icontains=specialization,
+        ).values_list(
+            "id", "doctor_id", "day", "start_time", "end_time",
+            "doctor__user__first_name", "doctor__user__last_name", "doctor__specialization",
+        )
+    ):
+        rules[doctor_id][day].append((availability_id, start, end))
+        doctors[doctor_id] = {
+            "name": f"Dr. {first_name} {last_name}".strip(),
+            "specialization": doctor_specialization,
+        }
+    if not rules or first > last:
+        return []
+
+    booked = defaultdict(lambda: defaultdict(list))
+    for doctor_id, date, start, end in Appointment.holding_slots().filter(
+        doctor_id__in=rules, date__range=(first, last)
+    ).values_list("doctor_id", "date", "start_time", "end_time"):
+        booked[doctor_id][date].append((start, end))
+
+    streams = [
+        _doctor_slot_stream(doctor_id, weekly, booked[doctor_id], first, last, not_before)
+        for doctor_id, weekly in rules.items()
+    ]
+    return [
+        {
+            "date": date,
+            "start": start,
+            "end": end,
+            "doctor": doctor_id,
+            "availability": availability_id,
+            **doctors[doctor_id],
+        }
+        for date, start, end, doctor_id, availability_id in islice(heapq.merge(*streams), limit)
+    ]
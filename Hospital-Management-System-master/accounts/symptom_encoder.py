@@ -0,0 +1,86 @@
+import threading
+
+import numpy as np
+
+
+class SymptomEncoder:
+    """
+    Maps symptom names to the 0/1 input rows the prediction models expect.
+
+    The vocabulary is taken from the training columns and pickled with the
+    models (inside ensemble.pkl), so serving never has to read
+    dataset.csv or import pandas. Lookups go through a name -> column dict,
+    making encoding O(number of symptoms given) instead of a scan over the
+    whole vocabulary.
+    """
+
+    def __init__(self, symptoms):
+        self.symptoms = tuple(symptoms)
+        self.index = {symptom: idx for idx, symptom in enumerate(self.symptoms)}
+        self._local = threading.local()
+
+    @classmethod
+    def from_estimator(cls, estimator):
+        """Build the encoder from a model fitted on a DataFrame (feature_names_in_)."""
+        return cls(estimator.feature_names_in_)
+
+    def __len__(self):
+        return len(self.symptoms)
+
+    def __getstate__(self):
+        # The per-thread buffers are scratch space, not part of the artifact.
+        return {"symptoms": self.symptoms}
+
+    def __setstate__(self, state):
+        self.__init__(state["symptoms"])
+
+    @staticmethod
+    def split(symptoms):
+        """Accept either a comma separated string or an iterable of symptom names."""
+        if isinstance(symptoms, str):
+            return symptoms.split(",")
+        return symptoms
+
+    def indices(self, symptoms):
+        """Sorted, de-duplicated column indices of the known symptoms; unknown names are dropped."""
+        index = self.index
+        return sorted({index[s] for s in self.split(symptoms) if s in index})
+
+    def encode(self, symptoms):
+        """
+        Encode one symptom set into a (1, n_symptoms) row.
+
+        The row lives in a buffer preallocated per thread and is only valid
+        until the next encode() call on the same thread.
+        """
+        local = self._local
+        buffer = getattr(local, "buffer", None)
+        if buffer is None:
+            buffer = local.buffer = np.zeros((1, len(self.symptoms)))
+            local.set_columns = []
+        buffer[0, local.set_columns] = 0
+        local.set_columns = self.indices(symptoms)
+        buffer[0, local.set_columns] = 1
+        return buffer
+
+    def encode_batch(self, symptom_sets, sparse=False):
+        """
+        Encode many symptom sets into an (n_rows, n_symptoms) matrix.
+
+        With sparse=True a scipy CSR matrix is returned, which is much
+        smaller for large batches since rows only carry a handful of symptoms.
+        """
+        rows = [self.indices(symptoms) for symptoms in symptom_sets]
+        indptr = np.zeros(len(rows) + 1, dtype=np.intp)
+        np.cumsum([len(row) for row in rows], out=indptr[1:])
+        columns = np.fromiter((col for row in rows for col in row), dtype=np.intp, count=indptr[-1])
+
+        if sparse:
+            from scipy.sparse import csr_matrix
+
+            data = np.ones(len(columns))
+            return csr_matrix((data, columns, indptr), shape=(len(rows), len(self.symptoms)))
+
+        matrix = np.zeros((len(rows), len(self.symptoms)))
+        matrix[np.repeat(np.arange(len(rows)), np.diff(indptr)), columns] = 1
+        return matrix
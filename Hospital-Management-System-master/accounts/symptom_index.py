@@ -0,0 +1,129 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+
+def normalize(text):
+    """Lower-case and turn any run of spaces, dashes or underscores into one underscore."""
+    return re.sub(r"[\s_\-]+", "_", text.strip().lower()).strip("_")
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def display_name(symptom):
+    """Human readable form of a column name ("spotting_ urination" -> "spotting urination")."""
+    return normalize(symptom).replace("_", " ")
+
+
+class SymptomIndex:
+    """
+    Typeahead and fuzzy lookup over the symptom vocabulary.
+
+    Built once per loaded model version from the encoder's vocabulary:
+    - a dict from normalized name to the canonical column name, for exact matches
+    - a sorted list of every word suffix ("skin_rash", "rash") for prefix
+      search with bisect
+    - a trigram -> symptom posting list for fuzzy matching of typos
+    """
+
+    # Minimum trigram similarity for resolve() to accept a fuzzy match,
+    # and for search() to pad prefix matches with fuzzy suggestions
+    MIN_SIMILARITY = 0.5
+    MIN_SUGGESTION_SIMILARITY = 0.3
+
+    def __init__(self, symptoms):
+        self.symptoms = tuple(symptoms)
+        self.exact = {}
+        suffixes = []
+        self.trigrams = defaultdict(list)
+        self._trigram_counts = []
+
+        for idx, symptom in enumerate(self.symptoms):
+            key = normalize(symptom)
+            self.exact.setdefault(key, symptom)
+            words = key.split("_")
+            for start in range(len(words)):
+                suffixes.append(("_".join(words[start:]), start, idx))
+            grams = trigrams(key)
+            self._trigram_counts.append(len(grams))
+            for gram in grams:
+                self.trigrams[gram].append(idx)
+
+        suffixes.sort()
+        self._suffix_keys = [suffix for suffix, _, _ in suffixes]
+        self._suffix_entries = [(start, idx) for _, start, idx in suffixes]
+
+    def prefix_matches(self, query):
+        """Symptoms with a word starting with query; whole-name prefixes first."""
+        found = {}
+        position = bisect_left(self._suffix_keys, query)
+        while position < len(self._suffix_keys) and self._suffix_keys[position].startswith(query):
+            start, idx = self._suffix_entries[position]
+            found[idx] = min(start, found.get(idx, start))
+            position += 1
+        return sorted(found, key=lambda idx: (found[idx], len(self.symptoms[idx]), self.symptoms[idx]))
+
+    def fuzzy_matches(self, query, limit):
+        """(similarity, symptom index) pairs ranked by Dice similarity of trigrams."""
+        grams = trigrams(query)
+        shared = defaultdict(int)
+        for gram in grams:
+            for idx in self.trigrams.get(gram, ()):
+                shared[idx] += 1
+        scored = [
+            (2 * count / (len(grams) + self._trigram_counts[idx]), idx)
+            for idx, count in shared.items()
+        ]
+        scored.sort(key=lambda item: (-item[0], self.symptoms[item[1]]))
+        return scored[:limit]
+
+    def search(self, text, limit=10):
+        """Typeahead suggestions for partially typed text (canonical names)."""
+        query = normalize(text)
+        if not query:
+            return []
+        results = self.prefix_matches(query)[:limit]
+        if len(results) < limit:
+            seen = set(results)
+            for similarity, idx in self.fuzzy_matches(query, limit):
+                if similarity < self.MIN_SUGGESTION_SIMILARITY:
+                    break
+                if idx not in seen:
+                    results.append(idx)
+                    if len(results) == limit:
+                        break
+        return [self.symptoms[idx] for idx in results]
+
+    def resolve(self, text):
+        """Canonical symptom name for free-typed text, or None if nothing is close enough."""
+        key = normalize(text)
+        if not key:
+            return None
+        if key in self.exact:
+            return self.exact[key]
+        best = self.fuzzy_matches(key, 1)
+        if best and best[0][0] >= self.MIN_SIMILARITY:
+            return self.symptoms[best[0][1]]
+        return None
+
+    def resolve_all(self, symptoms, known=None):
+        """
+        Resolve a comma separated string or list of symptoms to canonical names.
+
+        Names already in `known` (the encoder's index) are kept as they are;
+        unresolvable ones are dropped.
+        """
+        if isinstance(symptoms, str):
+            symptoms = symptoms.split(",")
+        resolved = []
+        for symptom in symptoms:
+            if known is not None and symptom in known:
+                resolved.append(symptom)
+                continue
+            canonical = self.resolve(symptom)
+            if canonical is not None:
+                resolved.append(canonical)
+        return resolved
@@ -1,3 +1,177 @@
-from django.test import TestCase
+import datetime
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+import numpy as np
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from sklearn.ensemble import RandomForestClassifier
+
+from .appointment_series import book_series
+from .compiled_forest import CompiledForest
+from .ensemble import FAST_VOTE_MIN_ROWS, FAST_VOTE_ORDER, VoteStats, fast_vote_order
+from .models import Appointment, Doctor, DoctorAvailability, Patient, Profile
+from .slots import book_first_free_slot
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Parallel bookings of one doctor-day must each get their own slot."""
+
+    BOOKERS = 8
+
+    def setUp(self):
+        user = Profile.objects.create_user("doctor", "pw", user_type="doctor")
+        self.doctor = Doctor.objects.create(
+            user=user, phone_number="1", specialization="General Physician", experience=5,
+            status="Approved", is_approved=True,
+        )
+        DoctorAvailability.objects.create(
+            doctor=self.doctor, day="Monday", start_time=datetime.time(9), end_time=datetime.time(17)
+        )
+        self.patients = [
+            Patient.objects.create(user=Profile.objects.create_user(f"patient{i}", "pw"), phone_number=str(100 + i))
+            for i in range(self.BOOKERS)
+        ]
+        self.date = datetime.date(2026, 10, 19)  # a Monday
+
+    def book_in_parallel(self, patients):
+        barrier = threading.Barrier(len(patients))
+        appointments, errors, latencies = [], [], []
+        lock = threading.Lock()
+
+        def book(patient):
+            try:
+                barrier.wait()
+                start = time.perf_counter()
+                appointment = book_first_free_slot(patient, self.doctor, self.date, status="Pending")
+                with lock:
+                    appointments.append(appointment)
+                    latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(patient,)) for patient in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return appointments, errors, latencies
+
+    def test_parallel_bookers_get_distinct_slots(self):
+        appointments, errors, latencies = self.book_in_parallel(self.patients)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(appointments), self.BOOKERS)
+        start_times = sorted(appointment.start_time for appointment in appointments)
+        self.assertEqual(len(set(start_times)), self.BOOKERS)
+        # Nobody skips ahead: the first N slots of the day are the ones taken
+        self.assertEqual(start_times, [datetime.time(9 + i // 2, 30 * (i % 2)) for i in range(self.BOOKERS)])
+        self.assertEqual(
+            len(set(Appointment.objects.values_list("appointment_id", flat=True))), self.BOOKERS
+        )
+        self.assertLess(max(latencies), 5.0)
+
+    def test_full_day_reports_no_slot(self):
+        DoctorAvailability.objects.filter(doctor=self.doctor).update(end_time=datetime.time(10))
+        appointments, errors, _ = self.book_in_parallel(self.patients[:4])
+
+        self.assertEqual(len(appointments), 2)
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(all(type(error).__name__ == "SlotUnavailable" for error in errors))
+
+
+class SeriesBookingTests(TestCase):
+    """Series occurrences must start on the doctor's slot grid."""
+
+    def setUp(self):
+        user = Profile.objects.create_user("doctor", "pw", user_type="doctor")
+        self.doctor = Doctor.objects.create(
+            user=user, phone_number="1", specialization="General Physician", experience=5,
+            status="Approved", is_approved=True,
+        )
+        DoctorAvailability.objects.create(
+            doctor=self.doctor, day="Monday", start_time=datetime.time(9), end_time=datetime.time(17)
+        )
+        self.patient = Patient.objects.create(user=Profile.objects.create_user("patient", "pw"), phone_number="100")
+        self.date = datetime.date(2030, 1, 7)  # a Monday
+
+    def test_off_grid_start_is_a_conflict(self):
+        appointments, conflicts = book_series(
+            self.patient, self.doctor, self.date, datetime.time(9, 15), 2, status="Pending"
+        )
+
+        self.assertEqual(appointments, [])
+        self.assertEqual([conflict["date"] for conflict in conflicts], [self.date, self.date + datetime.timedelta(weeks=1)])
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_on_grid_start_is_booked(self):
+        appointments, conflicts = book_series(
+            self.patient, self.doctor, self.date, datetime.time(9, 30), 2, status="Pending"
+        )
+
+        self.assertEqual(conflicts, [])
+        self.assertEqual([appointment.end_time for appointment in appointments], [datetime.time(10)] * 2)
+
+    def test_start_running_past_midnight_is_a_conflict(self):
+        appointments, conflicts = book_series(
+            self.patient, self.doctor, self.date, datetime.time(23, 30), 2, status="Pending"
+        )
+
+        self.assertEqual(appointments, [])
+        self.assertEqual(len(conflicts), 2)
+
+
+class FastVoteOrderTests(SimpleTestCase):
+    """The fast vote runs the cheapest models first and skips the most expensive one."""
+
+    def record(self, stats, rows, ms_per_row):
+        for _ in range(FAST_VOTE_MIN_ROWS):
+            stats.record(rows, {name: (rows, ms * rows / 1000) for name, ms in ms_per_row.items()})
+
+    def test_order_follows_recorded_costs(self):
+        stats = VoteStats()
+        self.record(stats, 1, {"nb": 0.9, "rf": 0.7, "svm": 0.14})
+        self.record(stats, 100, {"nb": 0.01, "rf": 0.03, "svm": 0.02})
+
+        self.assertEqual(fast_vote_order(stats.costs(1)), ("svm", "rf", "nb"))
+        self.assertEqual(fast_vote_order(stats.costs(100)), ("nb", "svm", "rf"))
+
+    def test_default_order_until_every_model_is_measured(self):
+        stats = VoteStats()
+        stats.record(1, {"nb": (1, 0.001), "rf": (1, 0.002), "svm": (1, 0.003)})
+        self.record(stats, 100, {"nb": 0.01, "rf": 0.03})
+
+        self.assertEqual(fast_vote_order(stats.costs(1)), FAST_VOTE_ORDER)
+        self.assertEqual(fast_vote_order(stats.costs(100)), FAST_VOTE_ORDER)
+
+
+class CompiledForestTests(SimpleTestCase):
+    """The compiled forest answers exactly like the sklearn forest it was built from."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(24)
+        # 0/1 rows like the encoded symptoms, with labels the trees can partly learn
+        X = rng.integers(0, 2, size=(400, 30)).astype(float)
+        y = X[:, :3] @ [1, 2, 4] + rng.integers(0, 2, size=400)
+        cls.forest = RandomForestClassifier(n_estimators=15, random_state=24).fit(X, y)
+        cls.rows = rng.integers(0, 2, size=(300, 30)).astype(float)
+
+    def assert_matches_forest(self, compiled):
+        np.testing.assert_allclose(compiled.predict_proba(self.rows), self.forest.predict_proba(self.rows))
+        np.testing.assert_array_equal(compiled.predict(self.rows), self.forest.predict(self.rows))
+        np.testing.assert_allclose(compiled.predict_proba(self.rows[:1]), self.forest.predict_proba(self.rows[:1]))
+
+    def test_matches_sklearn(self):
+        self.assert_matches_forest(CompiledForest.from_sklearn(self.forest))
+
+    def test_matches_sklearn_after_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            CompiledForest.from_sklearn(self.forest).save(directory)
+            self.assert_matches_forest(CompiledForest.load(directory))
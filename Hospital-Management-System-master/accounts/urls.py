@@ -50,7 +50,22 @@ urlpatterns = [
     path('my-appointments/', patient_appointments_view, name='patient_appointments'),
     
     path("predict-page/", predict_page, name="predict_page"),
+    path("symptoms/search/", symptom_search, name="symptom_search"),
     path("predict/", predict_disease, name="predict"),
+    path("predict/batch/", predict_disease_batch, name="predict_batch"),
+    path("predict/cache-stats/", prediction_cache_stats, name="prediction_cache_stats"),
+    path("predict/pool-stats/", prediction_pool_stats, name="prediction_pool_stats"),
+    path("predict/vote-stats/", prediction_vote_stats, name="prediction_vote_stats"),
+    path("doctors/<int:doctor_id>/slots/", doctor_open_slots, name="doctor_open_slots"),
+    path("appointments/earliest/", earliest_slots, name="earliest_slots"),
+    path("appointments/series/", book_appointment_series, name="book_appointment_series"),
+    path("appointments/waitlist/", waitlist, name="waitlist"),
+    path("appointments/waitlist/<int:entry_id>/withdraw/", withdraw_waitlist_entry, name="withdraw_waitlist_entry"),
+    path("availability/import/", import_availability_view, name="import_availability"),
+    path("occupancy/", occupancy_view, name="occupancy"),
+    path("occupancy/data/", occupancy_data, name="occupancy_data"),
+    path("calendar/feed/", calendar_feed_settings, name="calendar_feed_settings"),
+    path("calendar/<str:token>.ics", calendar_feed, name="calendar_feed"),
     
     path('doc-appointments/', doctor_appointments_view, name='doctor_appointments_view'),
     path('consulted-patients/', consulted_patients_list, name='consulted_patients'),
@@ -6,6 +6,7 @@ from .models import *
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import user_passes_test
 from .utils import send_status_email
+from django.db import IntegrityError
 from django.db.models import Q
 from datetime import time
 from .forms import *
@@ -17,7 +18,6 @@ from django.utils.encoding import force_bytes
 from django.core.mail import send_mail
 from .forms import *
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-import joblib  # Import joblib for saving models
 from django.db.models import Count
 
 
@@ -409,13 +409,16 @@ def doctor_availability(request):
     if request.method == "POST":
         form = DoctorAvailabilityForm(request.POST, doctor=doctor)
         if form.is_valid():
-            availability = form.save(commit=False)
-            availability.doctor = doctor  # Ensure the doctor is assigned before saving
-            try:
-                availability.save()
-                return redirect('doctor_availability')  # Change this to the correct URL name
-            except ValidationError as e:
-                form.add_error(None, e)  # Show error message on form
+            # Merged with any overlapping availability of the same day
+            summary = import_availability([{
+                'doctor': doctor.doctor_number,
+                'day': form.cleaned_data['day'],
+                'start_time': form.cleaned_data['start_time'].strftime('%H:%M:%S'),
+                'end_time': form.cleaned_data['end_time'].strftime('%H:%M:%S'),
+            }])
+            if summary['updated'] or summary['deleted']:
+                messages.info(request, "Overlapping availability detected. Merged with an existing slot.")
+            return redirect('doctor_availability')  # Change this to the correct URL name
 
     else:
         form = DoctorAvailabilityForm(doctor=doctor)
@@ -449,58 +452,29 @@ def update_appointment_status(request, appointment_id, new_status):
         return redirect("view_appointments")
 
     appointment.status = new_status
-    appointment.save()
-    
+    try:
+        appointment.save()
+    except IntegrityError:
+        # Reinstating a canceled appointment whose slot was booked again since
+        messages.error(request, "This time slot has been booked by another patient.")
+        return redirect("view_appointments")
+
     messages.success(request, f"Appointment has been {new_status.lower()}.")
     return redirect("view_appointments")
 
 @login_required
 def book_appointment(patient, doctor, date):
-    """ Book a 30-minute appointment for the patient on a specific date """
-
-    # Get the day of the week
-    day_of_week = date.strftime('%A')  # E.g., 'Monday', 'Tuesday'
+    """ Book the first free slot (APPOINTMENT_SLOT_MINUTES long) for the patient on a specific date """
 
-    # Get doctor's availability for that day
-    availability = DoctorAvailability.objects.filter(doctor=doctor, day=day_of_week).first()
-
-    if not availability:
+    if not DoctorAvailability.objects.filter(doctor=doctor, day=date.strftime('%A')).exists():
         raise ValidationError("Doctor is off on this day. Please choose another day.")
 
-    # Find all existing appointments for that day
-    existing_appointments = Appointment.objects.filter(doctor=doctor, date=date).order_by('start_time')
-
-    # Start from the doctor's available time
-    current_start_time = availability.start_time
-
-    # Check for the first available slot
-    while current_start_time < availability.end_time:
-        # Calculate end time (30 minutes after start time)
-        current_end_time = (datetime.combine(date, current_start_time) + timedelta(minutes=30)).time()
-
-        # Check if this slot is occupied
-        overlapping_appointments = existing_appointments.filter(
-            start_time__lt=current_end_time,
-            end_time__gt=current_start_time
-        )
-
-        if not overlapping_appointments.exists():
-            # Found an available slot, create the appointment
-            appointment = Appointment.objects.create(
-                patient=patient,
-                doctor=doctor,
-                date=date,
-                start_time=current_start_time,
-                end_time=current_end_time,
-                status='Pending'
-            )
-            return appointment.appointment_id
-
-        # Move to the next 30-minute slot
-        current_start_time = current_end_time
-
-    # No available slots
-    raise ValidationError("No available slots for this day. Please choose another date.")
+    # Book the first available slot, moving on if someone else takes it first
+    try:
+        appointment = book_first_free_slot(patient, doctor, date, status='Pending')
+    except SlotUnavailable:
+        raise ValidationError("No available slots for this day. Please choose another date.")
+    return appointment.appointment_id
 
 
 def doctor_appointments_view(request):
@@ -558,7 +532,11 @@ def update_appointment(request, appointment_id):
         if new_comment:
             appointment.advice = new_comment
 
-        appointment.save()
+        try:
+            appointment.save()
+        except IntegrityError:
+            messages.error(request, "This time slot has been booked by another patient.")
+            return redirect('doctor_appointment')
         patient_email = appointment.patient.user.email
         subject = "New Medical Advice for Your Appointment"
         message = (
@@ -595,10 +573,18 @@ def book_appointment_flow(request):
                 specialization = form.cleaned_data["specialization"]
                 weekday = selected_date.strftime("%A")
 
-                availabilities = DoctorAvailability.objects.filter(
-                    day=weekday,
-                    doctor__specialization__icontains=specialization
-                )
+                first, last = calendar_horizon()
+                if first <= selected_date <= last:
+                    # Windows that still have an open slot on that date
+                    availabilities = DoctorAvailability.objects.filter(
+                        id__in=open_slots(selected_date, specialization).values("availability")
+                    ).select_related("doctor__user")
+                else:
+                    # Outside the materialized calendar: fall back to the weekly rules
+                    availabilities = DoctorAvailability.objects.filter(
+                        day=weekday,
+                        doctor__specialization__icontains=specialization
+                    )
 
                 if not availabilities.exists():
                     form.add_error("date", f"No doctors available on {weekday} for specialization '{specialization}'.")
@@ -623,7 +609,7 @@ def book_appointment_flow(request):
             doctor = get_object_or_404(Doctor, id=doctor_id)
             availability = get_object_or_404(DoctorAvailability, id=availability_id, doctor=doctor)
 
-            selected_weekday = datetime.datetime.strptime(selected_date, "%Y-%m-%d").strftime("%A")
+            selected_weekday = datetime.strptime(selected_date, "%Y-%m-%d").strftime("%A")
             if availability.day != selected_weekday:
                 error_message = f"Invalid date selection. Dr. {doctor.user.last_name} is available on {availability.day}."
                 return redirect(f"/appointment-status/?error={error_message}")
@@ -646,33 +632,19 @@ def book_appointment_flow(request):
                 doctor = get_object_or_404(Doctor, id=doctor_id)
                 availability = get_object_or_404(DoctorAvailability, id=availability_id, doctor=doctor)
 
-                existing_appointments = Appointment.objects.filter(
-                    doctor=doctor,
-                    date=selected_date
-                ).order_by("start_time")
-
-                current_time = availability.start_time
-                while current_time < availability.end_time:
-                    next_time = (datetime.datetime.combine(datetime.date.today(), current_time) + datetime.timedelta(minutes=30)).time()
-
-                    if not existing_appointments.filter(start_time=current_time).exists():
-                        appointment = Appointment.objects.create(
-                            patient=request.user.patient,
-                            doctor=doctor,
-                            date=selected_date,
-                            start_time=current_time,
-                            end_time=next_time,
-                            symptoms=form.cleaned_data["symptoms"],
-                            comments=form.cleaned_data["comments"],
-                            status="Pending"
-                        )
-                        return redirect(f"/appointment-status/?success=1&appointment_id={appointment.appointment_id}")
-
-                    current_time = next_time
-                    if current_time >= availability.end_time:
-                        break
-
-                return redirect("/appointment-status/?error=No available slots for the selected date.")
+                try:
+                    appointment = book_first_free_slot(
+                        request.user.patient,
+                        doctor,
+                        selected_date,
+                        availability_id=availability.id,
+                        symptoms=form.cleaned_data["symptoms"],
+                        comments=form.cleaned_data["comments"],
+                        status="Pending"
+                    )
+                except SlotUnavailable as e:
+                    return redirect(f"/appointment-status/?error={e}")
+                return redirect(f"/appointment-status/?success=1&appointment_id={appointment.appointment_id}")
 
     return render(request, "book_appointment.html", {"form": AppointmentStep1Form(), "step": 1})
 
@@ -720,6 +692,8 @@ def doctors_view_patient(request):
     specialization = request.GET.get('specialization', '')
     name = request.GET.get('name', '')
     day = request.GET.get('day', datetime.today().strftime('%A'))
+    # A concrete date (YYYY-MM-DD) lists only doctors with an open slot that day
+    date = request.GET.get('date', '')
     
     doctors = Doctor.objects.filter(status='Approved', is_approved=True)
     
@@ -727,7 +701,17 @@ def doctors_view_patient(request):
         doctors = doctors.filter(specialization__icontains=specialization)
     if name:
         doctors = doctors.filter(Q(user__first_name__icontains=name) | Q(user__last_name__icontains=name))
-    if day:
+    if date:
+        try:
+            selected_date = datetime.strptime(date, '%Y-%m-%d').date()
+        except ValueError:
+            selected_date = None
+        first, last = calendar_horizon()
+        if selected_date and first <= selected_date <= last:
+            doctors = doctors.filter(id__in=open_slots(selected_date).values('doctor'))
+        elif selected_date:
+            doctors = doctors.filter(availabilities__day=selected_date.strftime('%A')).distinct()
+    elif day:
         doctors = doctors.filter(availabilities__day=day).distinct()
 
     paginator = Paginator(doctors, 3)
@@ -745,6 +729,7 @@ def doctors_view_patient(request):
         'specialization': specialization,
         'name': name,
         'day': day,
+        'date': date,
     }
     return render(request, 'doctors_list.html', context)
 
@@ -786,8 +771,28 @@ def patient_appointments_view(request):
 
 
 from django.http import JsonResponse
-from .predict import predict_disease
-import pandas as pd
+import json
+from django.conf import settings
+from django.utils import timezone
+from django.views.decorators.http import require_POST
+from .predict import run_prediction, search_symptoms
+from .symptom_index import display_name
+from .predict import predict_disease as predict_symptoms
+from .prediction_cache import merge_stats as merge_cache_stats, prediction_cache
+from .inference_pool import inference_pool, PoolSaturated, PredictionTimeout
+from .ensemble import VoteStats, vote_stats
+from .doctor_routing import routing_index
+from .slots import DaySlots, SlotUnavailable, book_first_free_slot, earliest_free_slots
+from .slot_calendar import horizon as calendar_horizon, open_slots
+from .availability_import import ScheduleImportError, import_availability, read_schedule
+from .appointment_series import book_series
+from .models import WaitlistEntry
+from .occupancy import occupancy_matrix
+from .calendar_feeds import current_body
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.urls import reverse
+import csv
 
 
 def predict_view(request):
@@ -795,52 +800,442 @@ def predict_view(request):
     if not symptoms:
         return JsonResponse({"error": "No symptoms provided"}, status=400)
 
-    result = predict_disease(symptoms)
+    result = predict_symptoms(symptoms)
     return JsonResponse(result)
 
 
-# Load trained models
-rf_model = joblib.load("models/rf_model.pkl")
-nb_model = joblib.load("models/nb_model.pkl")
-svm_model = joblib.load("models/svm_model.pkl")
+@login_required
+def predict_page(request):
+    """Renders the HTML page with symptom selection (suggestions come from symptom_search)."""
+    return render(request, "predict.html")
+
+@login_required
+def symptom_search(request):
+    """Typeahead for the symptom vocabulary: ?q=<partial text>&limit=<n>."""
+    try:
+        limit = min(max(int(request.GET.get("limit", 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    query = request.GET.get("q", "")
+    results = [
+        {"symptom": symptom, "label": display_name(symptom)}
+        for symptom in search_symptoms(query, limit)
+    ]
+    return JsonResponse({"query": query, "results": results})
+
+def prediction_unavailable(error):
+    """JSON error for a prediction the worker pool could not serve."""
+    if isinstance(error, PoolSaturated):
+        response = JsonResponse({"error": "Prediction service is busy, please retry"}, status=503)
+        response["Retry-After"] = "1"
+        return response
+    return JsonResponse({"error": "Prediction timed out"}, status=504)
+
+def parse_top_k(value):
+    """Number of ranked diseases requested (0 = none), clamped to a sane range."""
+    try:
+        return min(max(int(value or 0), 0), 10)
+    except (TypeError, ValueError):
+        return 0
 
-encoder = joblib.load("models/label_encoder.pkl")
+@login_required
+def predict_disease(request):
+    """
+    Predicts disease based on user symptoms. Pass ?top_k=N for the N most likely diseases.
 
-# Load dataset to get symptoms
-data = pd.read_csv("dataset.csv")
-symptoms_list = list(data.columns[:-1])  # Extract all symptom names
+    The response also lists approved doctors who treat the predicted disease
+    under "Bookable Doctors" (see accounts.doctor_routing).
+    """
+    try:
+        result = predict_symptoms(request.GET.get("symptoms", ""), parse_top_k(request.GET.get("top_k")))
+    except (PoolSaturated, PredictionTimeout) as e:
+        return prediction_unavailable(e)
+
+    result["Bookable Doctors"] = routing_index.doctors_for(result["Final Prediction"])
+    return JsonResponse(result)
 
 @login_required
-def predict_page(request):
-    """Renders the HTML page with symptom selection."""
-    return render(request, "predict.html", {"symptoms": symptoms_list})
+@require_POST
+def predict_disease_batch(request):
+    """
+    Predicts diseases for many symptom sets in one call.
+
+    Expects a JSON body {"symptoms": [["itching", "skin_rash"], "cough,high_fever", ...]}
+    (optionally with "top_k", and "doctors": true to add "Bookable Doctors" to every
+    result) and returns {"results": [...]} with one prediction per input row, in order.
+    """
+    try:
+        body = json.loads(request.body)
+        symptom_sets = body["symptoms"]
+        top_k = parse_top_k(body.get("top_k"))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({"error": "Expected a JSON body with a 'symptoms' list"}, status=400)
+
+    if not isinstance(symptom_sets, list) or not symptom_sets:
+        return JsonResponse({"error": "No symptoms provided"}, status=400)
+
+    max_batch_size = getattr(settings, "PREDICTION_MAX_BATCH_SIZE", 1000)
+    if len(symptom_sets) > max_batch_size:
+        return JsonResponse({"error": f"At most {max_batch_size} symptom sets per request"}, status=400)
+
+    for index, symptoms in enumerate(symptom_sets):
+        if not isinstance(symptoms, str) and not (
+            isinstance(symptoms, list) and all(isinstance(symptom, str) for symptom in symptoms)
+        ):
+            return JsonResponse(
+                {"error": f"symptoms[{index}] must be a comma-separated string or a list of strings"}, status=400
+            )
+
+    try:
+        results = run_prediction(symptom_sets, top_k)
+    except (PoolSaturated, PredictionTimeout) as e:
+        return prediction_unavailable(e)
+
+    if body.get("doctors"):
+        # One slot calendar lookup per distinct disease, not per row
+        doctors = {}
+        for result in results:
+            disease = result["Final Prediction"]
+            if disease not in doctors:
+                doctors[disease] = routing_index.doctors_for(disease)
+            result["Bookable Doctors"] = doctors[disease]
+    return JsonResponse({"results": results})
+
 
 @login_required
-def predict_disease(request):
-    """Predicts disease based on user symptoms."""
-    symptoms = request.GET.get("symptoms", "").split(",")
-    input_data = [1 if symptom in symptoms else 0 for symptom in symptoms_list]
+def doctor_open_slots(request, doctor_id):
+    """
+    Free appointment slots of a doctor on ?date=YYYY-MM-DD, as JSON.
+
+    Pass ?availability=<id> to only list slots of one availability window.
+    """
+    doctor = get_object_or_404(Doctor, id=doctor_id, is_approved=True)
+    try:
+        date = datetime.strptime(request.GET.get("date", ""), "%Y-%m-%d").date()
+        availability_id = int(request.GET["availability"]) if request.GET.get("availability") else None
+    except ValueError:
+        return JsonResponse({"error": "Expected ?date=YYYY-MM-DD (and an integer availability)"}, status=400)
+
+    slots = DaySlots.load(doctor, date)
+    return JsonResponse({
+        "doctor": doctor.id,
+        "date": date.isoformat(),
+        "slot_minutes": slots.slot_length,
+        "slots": [
+            {"start": start.strftime("%H:%M"), "end": end.strftime("%H:%M"), "availability": window}
+            for start, end, window in slots.free_slots(availability_id)
+        ],
+    })
+
+
+@login_required
+def earliest_slots(request):
+    """
+    The soonest free slots across every approved doctor of a specialization, as JSON.
+
+    Query parameters: specialization, from and to (YYYY-MM-DD, default today
+    and EARLIEST_SLOTS_MAX_DAYS later) and limit (1-50, default 10).
+    """
+    specialization = request.GET.get("specialization", "").strip()
+    today = timezone.localdate()
+    max_days = getattr(settings, "EARLIEST_SLOTS_MAX_DAYS", 90)
+    try:
+        first = datetime.strptime(request.GET["from"], "%Y-%m-%d").date() if request.GET.get("from") else today
+        last = (
+            datetime.strptime(request.GET["to"], "%Y-%m-%d").date() if request.GET.get("to")
+            else first + timedelta(days=max_days)
+        )
+        limit = min(max(int(request.GET.get("limit", 10)), 1), 50)
+    except ValueError:
+        return JsonResponse({"error": "Expected from/to as YYYY-MM-DD and an integer limit"}, status=400)
+    if not specialization:
+        return JsonResponse({"error": "No specialization provided"}, status=400)
+    if (last - first).days > max_days:
+        return JsonResponse({"error": f"The date range may span at most {max_days} days"}, status=400)
+
+    slots = earliest_free_slots(specialization, first, last, limit)
+    return JsonResponse({
+        "specialization": specialization,
+        "slots": [
+            {
+                **slot,
+                "date": slot["date"].isoformat(),
+                "start": slot["start"].strftime("%H:%M"),
+                "end": slot["end"].strftime("%H:%M"),
+            }
+            for slot in slots
+        ],
+    })
 
-    rf_prediction = rf_model.predict([input_data])[0]
-    nb_prediction = nb_model.predict([input_data])[0]
-    svm_prediction = svm_model.predict([input_data])[0]
 
-    # Convert numerical labels back to disease names
-    rf_prediction_name = encoder.inverse_transform([rf_prediction])[0]
-    nb_prediction_name = encoder.inverse_transform([nb_prediction])[0]
-    svm_prediction_name = encoder.inverse_transform([svm_prediction])[0]
+@login_required
+@require_POST
+def book_appointment_series(request):
+    """
+    Books the same weekly slot for a patient over many weeks, as JSON.
 
-    # Majority vote for final prediction
-    predictions = [rf_prediction_name, nb_prediction_name, svm_prediction_name]
-    final_prediction = max(set(predictions), key=predictions.count)
+    Expects {"doctor": id, "date": "YYYY-MM-DD", "start_time": "HH:MM",
+    "occurrences": n} (optionally "interval_weeks", "symptoms" and
+    "comments"). Bookable occurrences are created together; the others are
+    listed under "conflicts" with the reason.
+    """
+    patient = getattr(request.user, "patient", None)
+    if patient is None:
+        return JsonResponse({"error": "Only patients can book appointments"}, status=403)
+    max_occurrences = getattr(settings, "APPOINTMENT_SERIES_MAX_OCCURRENCES", 52)
+    try:
+        body = json.loads(request.body)
+        doctor_id = int(body["doctor"])
+        first_date = datetime.strptime(body["date"], "%Y-%m-%d").date()
+        start_time = datetime.strptime(body["start_time"], "%H:%M").time()
+        occurrences = int(body["occurrences"])
+        interval_weeks = int(body.get("interval_weeks", 1))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse(
+            {"error": "Expected a JSON body with doctor, date (YYYY-MM-DD), start_time (HH:MM) and occurrences"},
+            status=400,
+        )
+    if not 1 <= occurrences <= max_occurrences or interval_weeks < 1:
+        return JsonResponse(
+            {"error": f"occurrences must be between 1 and {max_occurrences}, interval_weeks at least 1"},
+            status=400,
+        )
+    doctor = get_object_or_404(Doctor, id=doctor_id, is_approved=True)
 
+    appointments, conflicts = book_series(
+        patient, doctor, first_date, start_time, occurrences, interval_weeks,
+        status="Pending", symptoms=str(body.get("symptoms", "")), comments=str(body.get("comments", "")),
+    )
     return JsonResponse({
-        "Final Prediction": final_prediction,
-        "Random Forest": rf_prediction_name,
-        "Naive Bayes": nb_prediction_name,
-        "SVM": svm_prediction_name,
+        "booked": [
+            {
+                "appointment_id": appointment.appointment_id,
+                "date": appointment.date.isoformat(),
+                "start": appointment.start_time.strftime("%H:%M"),
+                "end": appointment.end_time.strftime("%H:%M"),
+            }
+            for appointment in appointments
+        ],
+        "conflicts": [{**conflict, "date": conflict["date"].isoformat()} for conflict in conflicts],
+    }, status=201 if appointments else 409)
+
+
+def waitlist_entry_json(entry):
+    return {
+        "id": entry.id,
+        "doctor": entry.doctor_id,
+        "specialization": entry.specialization,
+        "from": entry.earliest_date.isoformat(),
+        "to": entry.latest_date.isoformat(),
+        "status": entry.status,
+        "appointment": entry.appointment.appointment_id if entry.appointment else None,
+    }
+
+
+@login_required
+def waitlist(request):
+    """
+    The patient's waitlist entries (GET), or join the waitlist (POST, JSON).
+
+    POST expects {"doctor": id} or {"specialization": "..."} plus "from" and
+    "to" (YYYY-MM-DD) and optionally "symptoms". When a matching appointment
+    is canceled, its slot is booked for the longest-waiting patient.
+    """
+    patient = getattr(request.user, "patient", None)
+    if patient is None:
+        return JsonResponse({"error": "Only patients can join the waitlist"}, status=403)
+    if request.method != "POST":
+        entries = patient.waitlist_entries.select_related("appointment").order_by("-created_at")
+        return JsonResponse({"entries": [waitlist_entry_json(entry) for entry in entries]})
+
+    try:
+        body = json.loads(request.body)
+        first = datetime.strptime(body["from"], "%Y-%m-%d").date()
+        last = datetime.strptime(body["to"], "%Y-%m-%d").date()
+        doctor_id = int(body["doctor"]) if body.get("doctor") else None
+        specialization = str(body.get("specialization", "")).strip()
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse(
+            {"error": "Expected a JSON body with doctor or specialization, and from/to as YYYY-MM-DD"}, status=400
+        )
+    if first > last or last < timezone.localdate():
+        return JsonResponse({"error": "The date window must not be empty or in the past"}, status=400)
+
+    approved = Doctor.objects.filter(status="Approved", is_approved=True)
+    if doctor_id:
+        doctor = get_object_or_404(approved, id=doctor_id)
+        specialization = ""
+    elif specialization:
+        # Entries store the doctors' own spelling so slot matching is an exact, indexed lookup
+        doctor = None
+        specialization = approved.filter(specialization__iexact=specialization).values_list(
+            "specialization", flat=True
+        ).first()
+        if specialization is None:
+            return JsonResponse({"error": "No approved doctor has this specialization"}, status=400)
+    else:
+        return JsonResponse({"error": "No doctor or specialization provided"}, status=400)
+
+    entry = WaitlistEntry.objects.create(
+        patient=patient, doctor=doctor, specialization=specialization,
+        earliest_date=max(first, timezone.localdate()), latest_date=last,
+        symptoms=str(body.get("symptoms", "")),
+    )
+    return JsonResponse(waitlist_entry_json(entry), status=201)
+
+
+@login_required
+@require_POST
+def withdraw_waitlist_entry(request, entry_id):
+    entry = get_object_or_404(
+        WaitlistEntry, id=entry_id, patient__user=request.user, status=WaitlistEntry.WAITING
+    )
+    entry.status = WaitlistEntry.WITHDRAWN
+    entry.save(update_fields=["status"])
+    return JsonResponse(waitlist_entry_json(entry))
+
+
+@user_passes_test(is_admin, login_url='login')
+def import_availability_view(request):
+    """
+    Upload a CSV or JSON schedule (doctor, day, start_time, end_time per row)
+    for any number of doctors; see accounts.availability_import.
+    """
+    context = {}
+    if request.method == "POST":
+        upload = request.FILES.get("schedule")
+        fmt = request.POST.get("format") or ("json" if upload and upload.name.endswith(".json") else "csv")
+        if not upload:
+            messages.error(request, "Please choose a schedule file.")
+        else:
+            try:
+                rows = read_schedule(upload.read(), fmt)
+                context["summary"] = import_availability(
+                    rows, replace=bool(request.POST.get("replace")), dry_run=bool(request.POST.get("dry_run"))
+                )
+                context["dry_run"] = bool(request.POST.get("dry_run"))
+            except ScheduleImportError as e:
+                context["errors"] = e.errors
+            except (ValueError, UnicodeDecodeError, csv.Error) as e:
+                context["errors"] = [f"Could not read the file: {e}"]
+    return render(request, "import_availability.html", context)
+
+
+def occupancy_range(request):
+    """(first, last) from ?from/?to (YYYY-MM-DD), default the coming week; raises ValueError."""
+    first = (
+        datetime.strptime(request.GET["from"], "%Y-%m-%d").date() if request.GET.get("from")
+        else timezone.localdate()
+    )
+    last = (
+        datetime.strptime(request.GET["to"], "%Y-%m-%d").date() if request.GET.get("to")
+        else first + timedelta(days=6)
+    )
+    max_days = getattr(settings, "OCCUPANCY_MAX_DAYS", 31)
+    if not 0 <= (last - first).days < max_days:
+        raise ValueError(f"The date range must span 1 to {max_days} days")
+    return first, last
+
+
+@user_passes_test(is_admin, login_url='login')
+def occupancy_data(request):
+    """Doctors x slots occupancy of a date range with utilisation summaries, as JSON."""
+    try:
+        first, last = occupancy_range(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(occupancy_matrix(first, last))
+
+
+@user_passes_test(is_admin, login_url='login')
+def occupancy_view(request):
+    """Heatmap of how full each doctor is per day, with per-specialization and per-day utilisation."""
+    try:
+        first, last = occupancy_range(request)
+    except ValueError as e:
+        messages.error(request, str(e))
+        first = timezone.localdate()
+        last = first + timedelta(days=6)
+    occupancy = occupancy_matrix(first, last)
+    for doctor in occupancy["doctors"]:
+        # (percent, cell opacity) per day
+        doctor["heat"] = [(value, 0.15 + 0.85 * value / 100 if value is not None else 0) for value in doctor["days"]]
+    return render(request, "occupancy.html", {
+        "occupancy": occupancy,
+        "first": first,
+        "last": last,
+        "days": [datetime.strptime(day, "%Y-%m-%d").date() for day in occupancy["days"]],
     })
 
+
+@login_required
+def calendar_feed_settings(request):
+    """
+    The logged-in doctor's or nurse's calendar feed URL, as JSON; POST issues
+    a new token, which stops the old URL from working.
+    """
+    if request.user.user_type not in ("doctor", "nurse"):
+        return JsonResponse({"error": "Calendar feeds are for doctors and nurses"}, status=403)
+    feed, _ = CalendarFeed.objects.get_or_create(user=request.user)
+    if request.method == "POST":
+        feed.token = generate_feed_token()
+        feed.save(update_fields=["token"])
+    return JsonResponse({"url": request.build_absolute_uri(reverse("calendar_feed", args=[feed.token]))})
+
+
+def calendar_feed(request, token):
+    """
+    A doctor's or nurse's appointments as an iCalendar (.ics) feed; the token
+    in the URL authenticates it. Polls whose ETag or Last-Modified still
+    matches get a 304 from a single lookup of the feed row; otherwise the
+    cached feed is served, regenerated first if an appointment changed.
+    """
+    feed = get_object_or_404(CalendarFeed.objects.select_related("user").defer("body"), token=token)
+    etag = f'"{feed.pk}-{feed.changed_at.timestamp():.6f}"'
+    last_modified = int(feed.changed_at.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(current_body(feed), content_type="text/calendar; charset=utf-8")
+        response["Content-Disposition"] = f'inline; filename="{feed.user.username}.ics"'
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@user_passes_test(is_admin, login_url='login')
+def prediction_cache_stats(request):
+    """
+    Hit/miss counters of the prediction cache, for sizing PREDICTION_CACHE_SIZE.
+
+    In pool mode every worker has its own cache; their latest counters are summed.
+    """
+    if getattr(settings, "PREDICTION_EXECUTION_MODE", "inline") == "pool":
+        return JsonResponse(merge_cache_stats(inference_pool.worker_stats("cache")))
+    return JsonResponse(prediction_cache.stats())
+
+
+@user_passes_test(is_admin, login_url='login')
+def prediction_pool_stats(request):
+    """Queue and timing counters of the prediction worker pool."""
+    return JsonResponse(inference_pool.stats())
+
+
+@user_passes_test(is_admin, login_url='login')
+def prediction_vote_stats(request):
+    """
+    Per-model timings of the ensemble and how often the fast vote skipped its most expensive model.
+
+    In pool mode the models run in the workers; their latest counters are summed.
+    """
+    if getattr(settings, "PREDICTION_EXECUTION_MODE", "inline") == "pool":
+        snapshots = inference_pool.worker_stats("vote")
+        combined = VoteStats()
+        for stats in snapshots:
+            combined.merge(stats)
+        return JsonResponse({"processes": len(snapshots), **combined.stats()})
+    return JsonResponse(vote_stats.stats())
+
 def doctor_appointments_view(request):
     # Get the logged-in patient (assuming authentication is set up)
     doctor = get_object_or_404(Doctor, user=request.user)
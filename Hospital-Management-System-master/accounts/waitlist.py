@@ -0,0 +1,70 @@
+from django.core.mail import send_mail
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+
+def next_in_line(doctor, date, exclude_patient_id=None):
+    """
+    The oldest waiting entry that a slot of doctor on date can serve: entries
+    for that doctor, or for its specialization without a doctor, whose date
+    window contains date. Both branches are covered by an index on
+    (status, doctor|specialization, created_at).
+    """
+    from .models import WaitlistEntry
+
+    entries = WaitlistEntry.objects.filter(
+        Q(doctor=doctor) | Q(doctor__isnull=True, specialization=doctor.specialization),
+        status=WaitlistEntry.WAITING, earliest_date__lte=date, latest_date__gte=date,
+    )
+    if exclude_patient_id is not None:
+        entries = entries.exclude(patient_id=exclude_patient_id)
+    return entries.select_related("patient__user").order_by("created_at").first()
+
+
+def backfill_slot(doctor, date, start_time, end_time, exclude_patient_id=None):
+    """
+    Book a freed slot for the first patient in line. Returns the new
+    appointment, or None when nobody is waiting, the slot is already past or
+    someone else booked it first.
+    """
+    from .models import Appointment, WaitlistEntry
+
+    if (date, start_time) < (timezone.localdate(), timezone.localtime().time()):
+        return None
+    try:
+        with transaction.atomic():
+            entry = next_in_line(doctor, date, exclude_patient_id)
+            if entry is None:
+                return None
+            appointment = Appointment.objects.create(
+                patient=entry.patient, doctor=doctor, date=date, start_time=start_time, end_time=end_time,
+                status="Pending", symptoms=entry.symptoms, comments="Booked from the waitlist",
+            )
+            entry.status, entry.appointment = WaitlistEntry.BOOKED, appointment
+            entry.save(update_fields=["status", "appointment"])
+    except IntegrityError:
+        # The slot was rebooked before we got to it
+        return None
+
+    transaction.on_commit(lambda: notify(entry, appointment))
+    return appointment
+
+
+def notify(entry, appointment):
+    user = entry.patient.user
+    if not user.email:
+        return
+    send_mail(
+        "An appointment slot opened up for you",
+        (
+            f"Dear {user.first_name},\n\n"
+            f"A slot opened up with Dr. {appointment.doctor.user.last_name} on {appointment.date} "
+            f"at {appointment.start_time.strftime('%H:%M')} and has been booked for you "
+            f"(appointment {appointment.appointment_id}).\n\n"
+            "If you no longer need it, please cancel it from your dashboard.\n\n"
+            "Best regards,\nHospital Management Team"
+        ),
+        "noreply@hospital.com", [user.email], fail_silently=True,
+    )
+
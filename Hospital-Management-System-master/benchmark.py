@@ -0,0 +1,295 @@
+"""
+Benchmarks for the disease prediction path.
+
+    python benchmark.py                       # every section, results in benchmark_results.json
+    python benchmark.py --sections warm batch --output before.json
+
+Sections:
+    cold    fresh interpreter: Django setup + importing accounts.predict, and the first prediction
+    warm    single-row latency of accounts.predict.predict_disease (cache misses and hits)
+            and of the /predict/ view
+    batch   predict_batch throughput at several batch sizes
+    forest  the served forest: sklearn RandomForest vs its accounts.compiled_forest
+    vote    soft vote vs PREDICTION_FAST_VOTE: latency, per-model time and short-circuit rate
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+DATA_PATH = "dataset.csv"
+SECTIONS = ("cold", "warm", "batch", "forest", "vote")
+
+
+def latency_ms(fn, rows, repeat=1):
+    """Call fn on each row and return the latencies in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        for row in rows:
+            start = time.perf_counter()
+            fn(row)
+            timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def summarize(timings):
+    return {
+        "n": int(len(timings)),
+        "mean_ms": float(np.mean(timings)),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p90_ms": float(np.percentile(timings, 90)),
+        "p99_ms": float(np.percentile(timings, 99)),
+        "max_ms": float(np.max(timings)),
+    }
+
+
+def describe(name, stats):
+    print(f"  {name:<20} p50={stats['p50_ms']:8.3f} ms  p99={stats['p99_ms']:8.3f} ms")
+    return stats
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hospital_management_system.settings")
+    import django
+
+    django.setup()
+
+
+def random_symptom_sets(n, seed=0, per_row=4):
+    from accounts.predict import get_symptoms
+
+    symptoms = list(get_symptoms())
+    rng = np.random.default_rng(seed)
+    return [list(rng.choice(symptoms, per_row, replace=False)) for _ in range(n)]
+
+
+COLD_SCRIPT = """
+import json, os, time
+start = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hospital_management_system.settings")
+import django
+django.setup()
+import accounts.urls
+imported = time.perf_counter()
+from accounts.predict import predict_disease
+predict_disease("itching,skin_rash")
+first = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "first_prediction_ms": (first - imported) * 1000}))
+"""
+
+
+def bench_cold(runs=3):
+    """Import and first-prediction cost in fresh interpreters."""
+    print(f"Cold start ({runs} fresh interpreters):")
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", COLD_SCRIPT],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    stats = {
+        key: describe(key, summarize([result[key] for result in results]))
+        for key in ("import_ms", "first_prediction_ms")
+    }
+    return stats
+
+
+def bench_warm(n_rows=300):
+    """Single-row latency once the models are loaded."""
+    from django.test import RequestFactory
+    from accounts import views
+    from accounts.predict import predict_disease
+    from accounts.prediction_cache import prediction_cache
+
+    symptom_sets = [",".join(row) for row in random_symptom_sets(n_rows)]
+    predict_disease(symptom_sets[0])
+
+    def uncached(symptoms):
+        prediction_cache.clear()
+        predict_disease(symptoms)
+
+    class BenchUser:
+        is_authenticated = True
+
+    factory = RequestFactory()
+
+    def view(symptoms):
+        prediction_cache.clear()
+        request = factory.get("/predict/", {"symptoms": symptoms})
+        request.user = BenchUser()
+        views.predict_disease(request)
+
+    print(f"Warm single-row latency ({n_rows} calls):")
+    results = {
+        "predict_disease_miss": describe("cache miss", summarize(latency_ms(uncached, symptom_sets))),
+        "predict_view_miss": describe("/predict/ view", summarize(latency_ms(view, symptom_sets))),
+    }
+    for symptoms in symptom_sets:
+        predict_disease(symptoms)
+    results["predict_disease_hit"] = describe("cache hit", summarize(latency_ms(predict_disease, symptom_sets)))
+    return results
+
+
+def bench_batch(batch_sizes=(1, 10, 100, 1000), repeat=5):
+    """predict_batch throughput with a cold cache."""
+    from accounts.predict import predict_batch
+    from accounts.prediction_cache import prediction_cache
+
+    symptom_sets = random_symptom_sets(max(batch_sizes), seed=1)
+    predict_batch(symptom_sets[:1])
+
+    def uncached(batch):
+        prediction_cache.clear()
+        predict_batch(batch)
+
+    print("Batch throughput:")
+    results = {}
+    for batch_size in batch_sizes:
+        stats = summarize(latency_ms(uncached, [symptom_sets[:batch_size]], repeat=repeat))
+        stats["rows_per_second"] = batch_size / (stats["p50_ms"] / 1000)
+        print(f"  batch={batch_size:<6} p50={stats['p50_ms']:9.3f} ms  {stats['rows_per_second']:10.0f} rows/s")
+        results[str(batch_size)] = stats
+    return results
+
+
+def bench_forest(n_rows=300, batch_sizes=(8, 64, 256, 1000)):
+    """
+    Compare the active version's sklearn forest against its compiled forest,
+    both as the model registry serves them.
+    """
+    import pandas as pd
+    from accounts.compiled_forest import CompiledForest
+    from accounts.model_registry import registry
+
+    models = registry.get()
+    rf_model = models.rf
+    # None when PREDICTION_COMPILED_FOREST is off; compile one to compare anyway
+    compiled = models.compiled_rf or CompiledForest.from_sklearn(rf_model)
+
+    symptoms = list(models.symptom_encoder.symptoms)
+    X = pd.read_csv(DATA_PATH).reindex(columns=symptoms, fill_value=0).to_numpy(dtype=np.float64)
+    rng = np.random.default_rng(0)
+    random_rows = (rng.random((max(batch_sizes), X.shape[1])) < 0.05).astype(np.float64)
+
+    # The compiled forest must be a drop-in replacement
+    for inputs in (X, random_rows):
+        if not np.array_equal(rf_model.predict(inputs), compiled.predict(inputs)):
+            raise SystemExit("Compiled forest predictions differ from sklearn!")
+    print(f"Compiled forest matches sklearn on {len(X) + len(random_rows)} rows")
+
+    rows = [X[i:i + 1] for i in rng.choice(len(X), n_rows)]
+    rf_model.predict(rows[0])
+    compiled.predict(rows[0])
+
+    print(f"Forest single-row latency ({n_rows} calls):")
+    results = {
+        "single_row": {
+            "sklearn": describe("sklearn", summarize(latency_ms(rf_model.predict, rows))),
+            "compiled": describe("compiled", summarize(latency_ms(compiled.predict, rows))),
+        }
+    }
+    for batch_size in batch_sizes:
+        batch = random_rows[:batch_size]
+        print(f"Forest batch of {batch_size} rows:")
+        results[f"batch_{batch_size}"] = {
+            "sklearn": describe("sklearn", summarize(latency_ms(rf_model.predict, [batch], repeat=20))),
+            "compiled": describe("compiled", summarize(latency_ms(compiled.predict, [batch], repeat=20))),
+        }
+    return results
+
+
+def bench_vote(n_rows=300, batch_size=1000):
+    """Soft voting against the short-circuiting fast vote, single rows and one batch."""
+    from accounts.ensemble import VoteStats, fast_vote_order
+    from accounts.model_registry import registry
+
+    models = registry.get()
+    symptom_sets = random_symptom_sets(batch_size, seed=2)
+    batch = models.symptom_encoder.encode_batch(symptom_sets)
+    rows = [batch[i:i + 1] for i in range(n_rows)]
+    overrides = {"rf": models.forest_for(1)}
+
+    results = {}
+    soft = models.ensemble.predict_encoded(batch)
+    # The fast vote runs cheapest first by the per-model costs the soft vote measured
+    soft_stats = stats = VoteStats()
+    for fast_vote in (False, True):
+        mode = "fast" if fast_vote else "soft"
+        if fast_vote:
+            stats = VoteStats()
+            single_order, batch_order = fast_vote_order(soft_stats.costs(1)), fast_vote_order(soft_stats.costs(batch_size))
+        else:
+            single_order = batch_order = None
+
+        def predict(row):
+            models.ensemble.predict_encoded(
+                row, overrides=overrides, fast_vote=fast_vote, stats=stats, order=single_order
+            )
+
+        print(f"{mode.capitalize()} vote:" + (f" order single={single_order} batch={batch_order}" if fast_vote else ""))
+        results[mode] = {"single_row": describe("single row", summarize(latency_ms(predict, rows)))}
+        start = time.perf_counter()
+        predicted = models.ensemble.predict_encoded(batch, fast_vote=fast_vote, stats=stats, order=batch_order)
+        results[mode][f"batch_{batch_size}_ms"] = (time.perf_counter() - start) * 1000
+        results[mode]["stats"] = stats.stats()
+        results[mode]["agreement_with_soft_vote"] = float(np.mean([
+            a["Final Prediction"] == b["Final Prediction"] for a, b in zip(predicted, soft)
+        ]))
+        print(f"  batch={batch_size} {results[mode][f'batch_{batch_size}_ms']:.1f} ms  "
+              f"short-circuit rate={results[mode]['stats']['short_circuit_rate']:.1%}  "
+              f"agreement with soft vote={results[mode]['agreement_with_soft_vote']:.1%}")
+    return results
+
+
+def environment():
+    import sklearn
+    from accounts.model_registry import registry
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    manifest = registry.get().manifest or {}
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "cpu_count": os.cpu_count(),
+        "models_dir": registry.artifact_dir(),
+        "model_version": manifest.get("version"),
+    }
+
+
+if __name__ == "__main__":
+    import warnings
+
+    parser = argparse.ArgumentParser(description="Benchmark the disease prediction path.")
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    # The models were fitted on a DataFrame; plain arrays trigger a feature-name warning per call
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    setup_django()
+
+    benchmarks = {"cold": bench_cold, "warm": bench_warm, "batch": bench_batch, "forest": bench_forest, "vote": bench_vote}
+    results = {"environment": environment()}
+    for section in args.sections:
+        results[section] = benchmarks[section]()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
@@ -79,6 +79,16 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so concurrent
+            # bookings queue on the busy timeout instead of failing with
+            # "database is locked" when upgrading a read lock
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # A file rather than the shared in-memory database, which reports
+        # lock conflicts between threads immediately instead of waiting
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -146,3 +156,31 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 LOGIN_URL = '/login/'
 
+
+# Disease prediction models (loaded lazily by accounts.model_registry)
+PREDICTION_MODELS_DIR = BASE_DIR / 'models'
+PREDICTION_MODELS_CHECK_INTERVAL = 2  # seconds between checks for updated pickles on disk
+PREDICTION_MAX_BATCH_SIZE = 1000  # symptom sets accepted by /predict/batch/
+PREDICTION_CACHE_SIZE = 4096  # distinct symptom sets kept by accounts.prediction_cache
+PREDICTION_CACHE_TTL = 3600  # seconds
+PREDICTION_COMPILED_FOREST = True  # evaluate the forest with accounts.compiled_forest instead of sklearn
+PREDICTION_COMPILED_FOREST_MAX_ROWS = 256  # larger batches go to sklearn, which is faster there
+PREDICTION_EXECUTION_MODE = 'inline'  # 'inline' or 'pool' (run models in accounts.inference_pool workers)
+PREDICTION_POOL_WORKERS = 2
+PREDICTION_POOL_QUEUE_SIZE = 16  # queued + running predictions before answering 503
+PREDICTION_TIMEOUT = 5  # seconds before a pooled prediction answers 504
+PREDICTION_FAST_VOTE = False  # hard majority vote that skips the costliest model where the other two agree
+
+# Disease -> doctor routing shown with predictions (accounts.doctor_routing)
+DOCTOR_ROUTING_TTL = 300  # seconds before other processes pick up doctor/availability changes
+DOCTOR_ROUTING_LIMIT = 5  # doctors listed per prediction
+DOCTOR_ROUTING_DAYS = 3  # next open days listed per doctor
+
+APPOINTMENT_SLOT_MINUTES = 30  # length of a bookable appointment slot (accounts.slots)
+APPOINTMENT_BOOKING_RETRIES = 20  # slot conflicts tolerated per booking before giving up
+APPOINTMENT_SERIES_MAX_OCCURRENCES = 52  # occurrences accepted by /appointments/series/
+SLOT_CALENDAR_WEEKS = 8  # rolling horizon of accounts.models.SlotCalendar (manage.py refresh_slot_calendar)
+EARLIEST_SLOTS_MAX_DAYS = 90  # widest date range accepted by /appointments/earliest/
+OCCUPANCY_MAX_DAYS = 31  # widest date range of the admin occupancy matrix (/occupancy/)
+CALENDAR_FEED_PAST_DAYS = 30  # past appointments kept in the doctors' and nurses' .ics feeds
+NURSE_ASSIGNMENT_TTL = 60  # seconds before accounts.nurse_assignment recounts nurses' daily loads
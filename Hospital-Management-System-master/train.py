@@ -1,40 +1,525 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import time
+from datetime import datetime, timezone
+
 import numpy as np
 import pandas as pd
 import joblib  # Import joblib for saving models
+from joblib import Parallel, delayed
 from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.svm import SVC
-from sklearn.naive_bayes import GaussianNB
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.naive_bayes import BernoulliNB, GaussianNB
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from accounts.compiled_forest import CompiledForest
+from accounts.symptom_encoder import SymptomEncoder
+from accounts.ensemble import SymptomEnsemble
+from accounts.model_registry import write_compiled_forest
 
-# Load dataset
 DATA_PATH = "dataset.csv"
-data = pd.read_csv(DATA_PATH).dropna(axis=1)
+MODELS_DIR = "models"
+VERSIONS_DIR = "versions"
+CURRENT_POINTER = "CURRENT"
+# Default PREDICTION_COMPILED_FOREST_MAX_ROWS: serving uses the compiled forest up to this batch size
+COMPILED_FOREST_MAX_ROWS = 256
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_data(data_path, encoder=None):
+    """Features, encoded labels and the label encoder (fitted here unless one is given)."""
+    data = pd.read_csv(data_path).dropna(axis=1)
+
+    # Encode target variable
+    if encoder is None:
+        encoder = LabelEncoder()
+        data["prognosis"] = encoder.fit_transform(data["prognosis"])
+    else:
+        data["prognosis"] = encoder.transform(data["prognosis"])
+
+    X = data.iloc[:, :-1]
+    y = data.iloc[:, -1]
+    return X, y, encoder
+
+
+def build_models():
+    return {
+        "svm": SVC(probability=True),
+        "nb": GaussianNB(),
+        # Use every core while fitting the forest
+        "rf": RandomForestClassifier(random_state=18, n_jobs=-1),
+    }
+
+
+def fit_model(name, model, X_train, y_train):
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    return name, model, time.perf_counter() - start
+
+
+def fit_models(models, X_train, y_train):
+    """Fit all models at once; threads are enough as the heavy lifting releases the GIL."""
+    fitted = Parallel(n_jobs=len(models), prefer="threads")(
+        delayed(fit_model)(name, model, X_train, y_train) for name, model in models.items()
+    )
+    return {name: (model, fit_seconds) for name, model, fit_seconds in fitted}
+
+
+def measure_latency(model, X, n_rows=200, batch_size=1000, method="predict"):
+    """
+    Single-row p50/p99 and batch latency of model.predict, in milliseconds.
+
+    `method` names another method of the model, or is a callable timed instead.
+    """
+    predict = method if callable(method) else getattr(model, method)
+    X = np.asarray(X, dtype=np.float64)
+    rows = [X[i:i + 1] for i in range(min(n_rows, len(X)))]
+    predict(rows[0])
+
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        predict(row)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    batch = X[np.arange(batch_size) % len(X)]
+    start = time.perf_counter()
+    predict(batch)
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "single_row_p50_ms": float(np.percentile(timings, 50)),
+        "single_row_p99_ms": float(np.percentile(timings, 99)),
+        f"batch_{batch_size}_ms": batch_ms,
+    }
+
+
+def write_version(models_dir, artifacts, manifest):
+    """
+    Save the artifacts into models/versions/<version>/ and return that directory.
+
+    A version named like an existing one (trained in the same second) gets a
+    -2, -3, ... suffix, which is recorded in the manifest.
+    """
+    base = manifest["version"]
+    for attempt in itertools.count(1):
+        version = base if attempt == 1 else f"{base}-{attempt}"
+        version_dir = os.path.join(models_dir, VERSIONS_DIR, version)
+        try:
+            os.makedirs(version_dir)
+            break
+        except FileExistsError:
+            continue
+    manifest["version"] = version
+    for file_name, artifact in artifacts.items():
+        joblib.dump(artifact, os.path.join(version_dir, file_name))
+    with open(os.path.join(version_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return version_dir
+
+
+def set_current(models_dir, version):
+    """Atomically point models/CURRENT at a version; serving picks it up on its next check."""
+    pointer = os.path.join(models_dir, CURRENT_POINTER)
+    tmp_pointer = pointer + ".tmp"
+    with open(tmp_pointer, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp_pointer, pointer)
+
+
+def active_dir(models_dir):
+    """Directory of the version models/CURRENT points at (the models dir itself if there is none)."""
+    try:
+        with open(os.path.join(models_dir, CURRENT_POINTER)) as f:
+            return os.path.join(models_dir, VERSIONS_DIR, f.read().strip())
+    except FileNotFoundError:
+        return models_dir
+
+
+def describe_model(model, fit_seconds, X_eval, y_eval):
+    if hasattr(model, "n_jobs"):
+        # Per-request predictions are single rows; don't fan out to every core
+        model.n_jobs = None
+    return {
+        "class": type(model).__name__,
+        "params": {key: repr(value) for key, value in model.get_params().items()},
+        "fit_seconds": fit_seconds,
+        "test_accuracy": float(model.score(X_eval, y_eval)),
+        "latency": measure_latency(model, X_eval),
+    }
+
+
+def publish(models_dir, models, encoder, X, data_path, models_manifest, activate, **extra):
+    """Write a new version (ensemble pickle + compiled forest + manifest) and optionally activate it."""
+    manifest = {
+        "version": datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S"),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "data_path": data_path,
+        "data_sha256": file_sha256(data_path),
+        "n_rows": int(len(X)),
+        "features": list(X.columns),
+        "classes": [str(label) for label in encoder.classes_],
+        "models": models_manifest,
+        **extra,
+    }
+    symptom_encoder = SymptomEncoder(X.columns)
+    artifacts = {
+        # What serving loads: every model plus both encoders in one pickle, so
+        # serving doesn't need dataset.csv or pandas
+        "ensemble.pkl": SymptomEnsemble(symptom_encoder, encoder, models),
+    }
+    version_dir = write_version(models_dir, artifacts, manifest)
+    write_compiled_forest(version_dir, models["rf"])
+    if activate:
+        set_current(models_dir, manifest["version"])
+    return version_dir, manifest
+
+
+def train(data_path=DATA_PATH, models_dir=MODELS_DIR, activate=True):
+    X, y, encoder = load_data(data_path)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=24)
+
+    fitted = fit_models(build_models(), X_train, y_train)
+
+    models_manifest = {
+        name: describe_model(model, fit_seconds, X_test, y_test)
+        for name, (model, fit_seconds) in fitted.items()
+    }
+    models = {name: model for name, (model, _) in fitted.items()}
+    return publish(models_dir, models, encoder, X, data_path, models_manifest, activate)
+
+
+def sweep_candidates():
+    """
+    (ensemble slot, name, estimator) for every model the sweep tries.
+
+    Each slot only gets the estimator family serving and train_incremental
+    expect there: forests for "rf" (compiled, grown with warm_start), naive
+    Bayes for "nb" (partial_fit) and SVCs for "svm".
+    """
+    for n_estimators in (10, 25, 50, 100, 200):
+        for max_depth in (None, 16, 8):
+            yield "rf", f"RandomForest(n_estimators={n_estimators}, max_depth={max_depth})", RandomForestClassifier(
+                n_estimators=n_estimators, max_depth=max_depth, random_state=18, n_jobs=-1
+            )
+    for n_estimators in (25, 100):
+        yield "rf", f"ExtraTrees(n_estimators={n_estimators})", ExtraTreesClassifier(
+            n_estimators=n_estimators, random_state=18, n_jobs=-1
+        )
+    yield "nb", "GaussianNB()", GaussianNB()
+    # The symptom columns are 0/1, which is what BernoulliNB models
+    yield "nb", "BernoulliNB()", BernoulliNB()
+    yield "svm", "SVC(probability=True)", SVC(probability=True)
+    yield "svm", "SVC(kernel='linear', probability=True)", SVC(kernel="linear", probability=True)
+
+
+def serving_predictor(slot, model, encoder):
+    """
+    The call serving makes for one ensemble slot (SymptomEnsemble._run_model),
+    with the forest compiled for small batches as ModelBundle.forest_for does.
+    """
+    ensemble = SymptomEnsemble(None, encoder, {slot: model})
+    compiled = CompiledForest.from_sklearn(model) if slot == "rf" else None
+
+    def predict(X):
+        overrides = {slot: compiled} if compiled is not None and X.shape[0] <= COMPILED_FOREST_MAX_ROWS else {}
+        return ensemble._run_model(slot, X, overrides, None)
+
+    return predict
+
+
+def evaluate_candidate(slot, model, encoder, X_train, y_train, X_test, y_test):
+    """Fit one candidate; returns its report entry and its test probabilities over every label."""
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    if hasattr(model, "n_jobs"):
+        model.n_jobs = None
+
+    proba = np.zeros((len(X_test), len(encoder.classes_)))
+    proba[:, model.classes_] = model.predict_proba(X_test)
+    report = {
+        "accuracy": float(model.score(X_test, y_test)),
+        "size_bytes": len(pickle.dumps(model)),
+        "fit_seconds": fit_seconds,
+        # What the latency budget is about: the serving path, not sklearn's predict_proba
+        "latency": measure_latency(model, X_test, method=serving_predictor(slot, model, encoder)),
+    }
+    return report, proba
+
+
+def pareto_front(entries):
+    """Entries no other entry beats on accuracy, single-row latency and size at once."""
+    def costs(entry):
+        return (-entry["accuracy"], entry["latency"]["single_row_p50_ms"], entry["size_bytes"])
+
+    front = []
+    for entry in entries:
+        dominated = any(
+            all(a <= b for a, b in zip(costs(other), costs(entry))) and costs(other) != costs(entry)
+            for other in entries
+        )
+        if not dominated:
+            front.append(entry)
+    return front
+
+
+def best_ensemble(fronts, probas, y_test, latency_budget=None):
+    """
+    The combination of one Pareto-optimal model per slot with the best soft-vote
+    accuracy whose summed single-row p50 fits latency_budget (ms).
+    """
+    y_test = np.asarray(y_test)
+    best = None
+    for combination in itertools.product(*fronts.values()):
+        latency = sum(entry["latency"]["single_row_p50_ms"] for entry in combination)
+        if latency_budget is not None and latency > latency_budget:
+            continue
+        proba = sum(probas[entry["name"]] for entry in combination)
+        accuracy = float(np.mean(np.argmax(proba, axis=1) == y_test))
+        if best is None or (accuracy, -latency) > (best["accuracy"], -best["single_row_p50_ms"]):
+            best = {
+                "models": {slot: entry["name"] for slot, entry in zip(fronts, combination)},
+                "accuracy": accuracy,
+                "single_row_p50_ms": latency,
+                "size_bytes": sum(entry["size_bytes"] for entry in combination),
+            }
+    return best
+
+
+def active_accuracy(models_dir, X_test, y_test, encoder):
+    """
+    Soft-vote accuracy of the active version on the sweep's test rows; None
+    when there is no active version or it uses other symptom columns.
+    """
+    try:
+        ensemble = joblib.load(os.path.join(active_dir(models_dir), "ensemble.pkl"))
+    except FileNotFoundError:
+        return None
+    if list(ensemble.symptom_encoder.symptoms) != list(X_test.columns):
+        return None
+    proba, _ = ensemble.predict_proba(np.asarray(X_test, dtype=np.float64))
+    predicted = ensemble.labels.take(np.argmax(proba, axis=1))
+    return float(np.mean(predicted == encoder.inverse_transform(y_test)))
+
+
+def sweep(data_path=DATA_PATH, models_dir=MODELS_DIR, latency_budget=None, report_path="sweep_report.json",
+          activate=True):
+    """
+    Train every sweep candidate on the usual split and write a Pareto report.
+
+    With a latency budget the best ensemble that fits it is also published as
+    a new version. It only becomes the active one when it beats the active
+    version's accuracy on the same test rows (or nothing comparable is active).
+    """
+    X, y, encoder = load_data(data_path)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=24)
+
+    entries, probas, fitted = [], {}, {}
+    for slot, name, model in sweep_candidates():
+        report, probas[name] = evaluate_candidate(slot, model, encoder, X_train, y_train, X_test, y_test)
+        entries.append({"slot": slot, "name": name, **report})
+        fitted[name] = model
+
+    fronts = {}
+    for slot in ("svm", "nb", "rf"):
+        fronts[slot] = pareto_front([entry for entry in entries if entry["slot"] == slot])
+        for entry in fronts[slot]:
+            entry["pareto"] = True
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "data_path": data_path,
+        "data_sha256": file_sha256(data_path),
+        "latency_budget_ms": latency_budget,
+        "candidates": entries,
+        "best_ensemble": best_ensemble(fronts, probas, y_test),
+        "best_ensemble_within_budget": best_ensemble(fronts, probas, y_test, latency_budget),
+        "active_accuracy": active_accuracy(models_dir, X_test, y_test, encoder),
+    }
+
+    version_dir = None
+    chosen = report["best_ensemble_within_budget"]
+    if latency_budget is not None and chosen is not None:
+        current = report["active_accuracy"]
+        if current is not None and chosen["accuracy"] <= current:
+            # Publish it for inspection, but keep serving the better version
+            activate = False
+        report["activated"] = activate
+        models = {slot: fitted[name] for slot, name in chosen["models"].items()}
+        fit_seconds = {entry["name"]: entry["fit_seconds"] for entry in entries}
+        models_manifest = {
+            slot: describe_model(model, fit_seconds[chosen["models"][slot]], X_test, y_test)
+            for slot, model in models.items()
+        }
+        version_dir, _ = publish(
+            models_dir, models, encoder, X, data_path, models_manifest, activate,
+            sweep={"latency_budget_ms": latency_budget, **chosen},
+        )
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report, version_dir
+
+
+def print_sweep_report(report):
+    print(f"{'slot':<5} {'model':<48} {'accuracy':>8} {'p50 ms':>8} {'batch ms':>9} {'size KB':>9}")
+    for entry in sorted(report["candidates"], key=lambda entry: (entry["slot"], -entry["accuracy"])):
+        print(f"{entry['slot']:<5} {entry['name']:<48} {entry['accuracy']:8.3f} "
+              f"{entry['latency']['single_row_p50_ms']:8.2f} {entry['latency']['batch_1000_ms']:9.1f} "
+              f"{entry['size_bytes'] / 1024:9.0f}{'  *' if entry.get('pareto') else ''}")
+    print("* = Pareto optimal (accuracy / single-row latency / size)")
+    for key in ("best_ensemble", "best_ensemble_within_budget"):
+        best = report[key]
+        if best is None:
+            print(f"{key}: nothing fits the latency budget")
+        else:
+            print(f"{key}: accuracy={best['accuracy']:.3f} p50={best['single_row_p50_ms']:.2f}ms {best['models']}")
+    if report["active_accuracy"] is not None:
+        print(f"active version: accuracy={report['active_accuracy']:.3f}")
+    if "activated" in report and not report["activated"]:
+        print("The published version was not activated (it doesn't beat the active one, or --no-activate).")
+
+
+class FullRetrainRequired(Exception):
+    """The appended rows can't be folded into the current models incrementally."""
+
+
+def train_incremental(data_path=DATA_PATH, models_dir=MODELS_DIR, activate=True,
+                      extra_trees=10, svm_min_accuracy=0.9):
+    """
+    Update the active version with the rows appended to data_path since it was trained.
+
+    - GaussianNB: partial_fit on the new rows only.
+    - RandomForest: warm start, growing `extra_trees` more trees. They are fit
+      on every row with a label the forest already knows, since sklearn
+      requires warm-started trees to see the same set of classes; the
+      existing trees are kept as they are.
+    - SVC: kept unless its accuracy on the new rows drops below
+      svm_min_accuracy, in which case it alone is refit on all rows.
+
+    A fifth of the new rows (at least one) is held out of every update, and
+    the manifest's test_accuracy is measured on those rows.
+    """
+    source_dir = active_dir(models_dir)
+    try:
+        with open(os.path.join(source_dir, "manifest.json")) as f:
+            parent = json.load(f)
+    except FileNotFoundError:
+        raise FullRetrainRequired(f"{source_dir} has no manifest.json; run a full training first.")
+    ensemble = joblib.load(os.path.join(source_dir, "ensemble.pkl"))
+    encoder = ensemble.label_encoder
+
+    try:
+        X, y, _ = load_data(data_path, encoder)
+    except ValueError as e:
+        raise FullRetrainRequired(f"New rows contain unknown diseases ({e}).")
+    if list(X.columns) != parent["features"]:
+        raise FullRetrainRequired("The symptom columns changed.")
+
+    X_new, y_new = X.iloc[parent["n_rows"]:], y.iloc[parent["n_rows"]:]
+    if X_new.empty:
+        raise SystemExit(f"No rows appended since version {parent['version']}; nothing to do.")
+    if len(X_new) < 2:
+        raise SystemExit(
+            f"Only one row appended since version {parent['version']}; at least two are needed "
+            "so one can be held out for scoring."
+        )
+
+    nb_model, rf_model, svm_model = ensemble.nb, ensemble.rf, ensemble.svm
+    unknown = set(y_new) - set(nb_model.classes_)
+    if unknown:
+        raise FullRetrainRequired(
+            f"New rows use diseases the models were never trained on: {sorted(encoder.inverse_transform(sorted(unknown)))}."
+        )
+
+    # None of the models sees these rows, so they give an honest test accuracy
+    X_fit, X_eval, y_fit, y_eval = train_test_split(
+        X_new, y_new, test_size=max(1, round(0.2 * len(X_new))), random_state=24
+    )
+    fit_rows = ~X.index.isin(X_eval.index)
+
+    models_manifest = {}
+
+    start = time.perf_counter()
+    nb_model.partial_fit(X_fit, y_fit)
+    models_manifest["nb"] = describe_model(nb_model, time.perf_counter() - start, X_eval, y_eval)
+    models_manifest["nb"]["update"] = "partial_fit"
 
-# Encode target variable
-encoder = LabelEncoder()
-data["prognosis"] = encoder.fit_transform(data["prognosis"])
+    start = time.perf_counter()
+    known = y.isin(rf_model.classes_) & fit_rows
+    rf_model.set_params(warm_start=True, n_estimators=rf_model.n_estimators + extra_trees, n_jobs=-1)
+    rf_model.fit(X[known], y[known])
+    rf_model.warm_start = False
+    models_manifest["rf"] = describe_model(rf_model, time.perf_counter() - start, X_eval, y_eval)
+    models_manifest["rf"]["update"] = f"warm_start +{extra_trees} trees"
 
-# Save the encoder for later use
-joblib.dump(encoder, "models/label_encoder.pkl")
+    # The active SVC has seen none of the new rows, so all of them can judge it
+    svm_accuracy = float(svm_model.score(X_new, y_new))
+    start = time.perf_counter()
+    if svm_accuracy < svm_min_accuracy:
+        svm_model.fit(X[fit_rows], y[fit_rows])
+        update = f"refit (accuracy on new rows {svm_accuracy:.3f} < {svm_min_accuracy})"
+    else:
+        update = f"kept (accuracy on new rows {svm_accuracy:.3f})"
+    models_manifest["svm"] = describe_model(svm_model, time.perf_counter() - start, X_eval, y_eval)
+    models_manifest["svm"]["update"] = update
 
-# Split data
-X = data.iloc[:, :-1]
-y = data.iloc[:, -1]
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=24)
+    models = {"svm": svm_model, "nb": nb_model, "rf": rf_model}
+    return publish(
+        models_dir, models, encoder, X, data_path, models_manifest, activate,
+        parent_version=parent["version"], incremental_rows=int(len(X_new)), test_rows=int(len(X_eval)),
+    )
 
-# Train models
-svm_model = SVC(probability=True)
-nb_model = GaussianNB()
-rf_model = RandomForestClassifier(random_state=18)
 
-svm_model.fit(X_train, y_train)
-nb_model.fit(X_train, y_train)
-rf_model.fit(X_train, y_train)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the disease prediction models.")
+    parser.add_argument("--data", default=DATA_PATH, help="training CSV (symptom columns + prognosis)")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--no-activate", action="store_true", help="write the version without pointing CURRENT at it")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fold in the rows appended since the active version was trained")
+    parser.add_argument("--extra-trees", type=int, default=10, help="trees added to the forest in --incremental mode")
+    parser.add_argument("--svm-min-accuracy", type=float, default=0.9,
+                        help="refit the SVM in --incremental mode when its accuracy on the new rows is below this")
+    parser.add_argument("--sweep", action="store_true",
+                        help="train candidate models and write a Pareto report of accuracy, latency and size")
+    parser.add_argument("--latency-budget", type=float,
+                        help="with --sweep, publish the most accurate ensemble whose single-row p50 (ms) fits this")
+    parser.add_argument("--report", default="sweep_report.json", help="where --sweep writes its report")
+    args = parser.parse_args()
 
-# Save trained models
-joblib.dump(svm_model, "models/svm_model.pkl")
-joblib.dump(nb_model, "models/nb_model.pkl")
-joblib.dump(rf_model, "models/rf_model.pkl")
+    if args.sweep:
+        report, version_dir = sweep(
+            args.data, args.models_dir, args.latency_budget, args.report, activate=not args.no_activate
+        )
+        print_sweep_report(report)
+        print(f"Report written to {args.report}")
+        if version_dir is not None:
+            print(f"Models saved successfully to {version_dir}!")
+        raise SystemExit()
 
-print("Models saved successfully!")
+    if args.incremental:
+        try:
+            version_dir, manifest = train_incremental(
+                args.data, args.models_dir, activate=not args.no_activate,
+                extra_trees=args.extra_trees, svm_min_accuracy=args.svm_min_accuracy,
+            )
+        except FullRetrainRequired as e:
+            raise SystemExit(f"Incremental update not possible: {e} Run train.py without --incremental.")
+    else:
+        version_dir, manifest = train(args.data, args.models_dir, activate=not args.no_activate)
+    for name, info in manifest["models"].items():
+        print(f"{name}: accuracy={info['test_accuracy']:.3f} fit={info['fit_seconds']:.2f}s "
+              f"p50={info['latency']['single_row_p50_ms']:.2f}ms {info.get('update', '')}")
+    print(f"Models saved successfully to {version_dir}!")